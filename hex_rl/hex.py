@@ -1,8 +1,9 @@
 from pprint import pprint
 import warnings
+from collections import deque
+from contextlib import contextmanager
 import numpy as np
-from rich.console import Console
-from typing import Tuple, Optional
+from typing import Tuple, Optional, Iterator
 
 
 class InvalidSizeError(Exception):
@@ -31,6 +32,116 @@ class InvalidActionError(Exception):
             super().__init__(f"Invalid action at cell {action}, played by {Hex.player_int_to_color(player)} / {Hex.player_int_to_char(player)}")
 
 
+class EmptyHistoryError(Exception):
+    """When there is no move to take back."""
+    def __init__(self, rich: bool = False) -> None:
+        # skip rich exceptions
+        super().__init__("No move to take back")
+
+
+
+# offsets of the four virtual edge nodes, appended after the size * size cells
+TOP, BOTTOM, LEFT, RIGHT = range(4)
+
+_NEIGHBOR_TABLES: dict[int, list[list[int]]] = dict()
+_EDGE_TABLES: dict[int, dict[int, list[list[int]]]] = dict()
+_INVERSE_TABLES: dict[int, list[int]] = dict()
+_ZOBRIST_TABLES: dict[int, np.ndarray] = dict()
+
+# xor-ed into the Zobrist key when player -1 is to move
+ZOBRIST_PLAYER = 0x9E3779B97F4A7C15
+
+
+def get_neighbor_table(size: int) -> list[list[int]]:
+    """Flat indices of the neighbors of every cell, computed once per size"""
+    if size not in _NEIGHBOR_TABLES:
+        table = list()
+        for row in range(size):
+            for col in range(size):
+                neighbors = [
+                    (row - 1, col), (row - 1, col + 1),
+                    (row, col - 1), (row, col + 1),
+                    (row + 1, col - 1), (row + 1, col)
+                ]
+                table.append([r * size + c for r, c in neighbors
+                              if 0 <= r < size and 0 <= c < size])
+        _NEIGHBOR_TABLES[size] = table
+    return _NEIGHBOR_TABLES[size]
+
+
+def get_edge_table(size: int) -> dict[int, list[list[int]]]:
+    """
+    Virtual edge nodes touched by every cell, per player, computed once per size
+    Player 1 owns the upper & lower edges, player -1 the left & right edges
+    """
+    if size not in _EDGE_TABLES:
+        n_cells = size * size
+        first, second = list(), list()
+        for row in range(size):
+            for col in range(size):
+                first.append([n_cells + edge for edge, touched in
+                              ((TOP, row == 0), (BOTTOM, row == size - 1)) if touched])
+                second.append([n_cells + edge for edge, touched in
+                               ((LEFT, col == 0), (RIGHT, col == size - 1)) if touched])
+        _EDGE_TABLES[size] = {1: first, -1: second}
+    return _EDGE_TABLES[size]
+
+
+def inverse_board(board: np.ndarray) -> np.ndarray:
+    """
+    The board seen by the other player, as after Hex.inverse:
+    stones are negated and cell (row, col) becomes (size - 1 - col, size - 1 - row)
+    Also inverses a batch of boards, of shape (..., size, size)
+    """
+    return -np.swapaxes(board[..., ::-1, ::-1], -1, -2)
+
+
+def inverse_action(tup_action, size: int):
+    """
+    The cell of an inversed board back in the original board, and vice versa
+    Also inverses a batch of cells, an (..., 2) array of rows and columns
+    """
+    if isinstance(tup_action, np.ndarray):
+        return size - 1 - tup_action[..., ::-1]
+    row, col = tup_action
+    return size - 1 - col, size - 1 - row
+
+
+def get_inverse_table(size: int) -> list[int]:
+    """
+    Where every cell and virtual edge node goes when the board is inversed,
+    cell (row, col) becomes (size - 1 - col, size - 1 - row)
+    """
+    if size not in _INVERSE_TABLES:
+        n_cells = size * size
+        table = [(size - 1 - index % size) * size + (size - 1 - index // size)
+                 for index in range(n_cells)]
+        # TOP, BOTTOM, LEFT, RIGHT become RIGHT, LEFT, BOTTOM, TOP
+        table += [n_cells + RIGHT, n_cells + LEFT, n_cells + BOTTOM, n_cells + TOP]
+        _INVERSE_TABLES[size] = table
+    return _INVERSE_TABLES[size]
+
+
+def get_zobrist_table(size: int) -> np.ndarray:
+    """
+    Random 64-bit keys of shape (2, size * size), row 0 for the stones of 1 and row 1 for -1
+    Seeded by the size so that keys stay the same between runs
+    """
+    if size not in _ZOBRIST_TABLES:
+        rng = np.random.default_rng([0x4E5A, size])
+        _ZOBRIST_TABLES[size] = rng.integers(0, 2 ** 64, size=(2, size * size), dtype=np.uint64, endpoint=False)
+    return _ZOBRIST_TABLES[size]
+
+
+def board_key(board: np.ndarray, player: int = 1) -> int:
+    """Zobrist key of any (size, size) board, equal to Hex.key of the same position"""
+    table = get_zobrist_table(board.shape[-1])
+    flat_board = board.reshape(-1)
+    key = int(np.bitwise_xor.reduce(table[0][flat_board == 1])) ^ \
+        int(np.bitwise_xor.reduce(table[1][flat_board == -1]))
+    return key ^ ZOBRIST_PLAYER if player == -1 else key
+
+
 
 class Hex:
     """The Hex core game."""
@@ -63,18 +174,63 @@ class Hex:
         self.reset()
 
 
+    @classmethod
+    def from_board(cls, board: np.ndarray, player: int = 1, rich_exceptions: bool = False) -> "Hex":
+        """
+        The game at any (size, size) board of 1, -1 and 0, with player to move
+        Its stones are not in the history, so they cannot be taken back
+        """
+        hex = cls(board.shape[-1], rich_exceptions=rich_exceptions)
+        for cell in np.flatnonzero(board).tolist():
+            hex._place(cell, int(board.flat[cell]))
+        hex.player = player
+        hex.winner = hex.check_winner()
+        return hex
+
+
     def reset(self) -> None:
-        self.board = self.init_board()
+        # the board is kept in both orientations, inverse() only switches between them
+        self._boards = (self.init_board(), self.init_board())
+        self._flat_boards = (self._boards[0].reshape(-1), self._boards[1].reshape(-1))
         self.player = 1
         self.winner = None
         self.inversed = False
 
-        self._first_groups: list[set[tuple[int, int]]] = list()
-        self._second_groups: list[set[tuple[int, int]]] = list()
+        # disjoint-set forest over the cells of the original orientation,
+        # the four virtual edge nodes come last
+        n_nodes = self.size * self.size + 4
+        self._parent: list[int] = list(range(n_nodes))
+        self._rank: list[int] = [0] * n_nodes
+
+        # Zobrist keys of the stones in both orientations, see key
+        self._zobrist = {stone: keys.tolist() for stone, keys in zip((1, -1), get_zobrist_table(self.size))}
+        self._keys = [0, 0]
+
+        # undo log: every disjoint-set write as (node, old parent, old rank),
+        # and every move as (cell in the original orientation, trail length before it)
+        self._trail: list[tuple[int, int, int]] = list()
+        self._history: list[tuple[int, int]] = list()
+
+        # empty cells of the original orientation, and the position of every cell in it,
+        # removed by swapping with the last one so that undo can put them back
+        self._empty: list[int] = list(range(self.size * self.size))
+        self._empty_position: list[int] = list(range(self.size * self.size))
 
     
     def init_board(self) -> np.ndarray:
         return np.zeros((self.size, self.size), dtype=int)
+
+
+    @property
+    def board(self) -> np.ndarray:
+        return self._boards[self.inversed]
+
+
+    @property
+    def key(self) -> int:
+        """64-bit Zobrist key of the position in the current orientation, including the player to move"""
+        key = self._keys[self.inversed]
+        return key ^ ZOBRIST_PLAYER if self.player == -1 else key
     
 
     def play(self, tup_action: tuple[int, int]) -> None:
@@ -84,9 +240,12 @@ class Hex:
         if not self.is_valid_action(tup_action):
             raise InvalidActionError(tup_action, self.board[tup_action], rich=self.rich_exceptions)
 
-        self.board[tup_action] = self.player
-
-        self._add_to_and_merge_groups(tup_action)
+        row, col = tup_action
+        cell = row * self.size + col
+        if self.inversed:
+            cell = get_inverse_table(self.size)[cell]
+        self._history.append((cell, len(self._trail)))
+        self._place(cell, -self.player if self.inversed else self.player)
         self.winner = self.check_winner()
 
         self.player *= -1
@@ -96,6 +255,26 @@ class Hex:
         return self.board[tup_action] == 0
 
 
+    def legal_moves(self) -> list[tuple[int, int]]:
+        """The empty cells in the current orientation, none after the game ended"""
+        if self.winner is not None:
+            return list()
+        if self.inversed:
+            inverse_table = get_inverse_table(self.size)
+            return [divmod(inverse_table[cell], self.size) for cell in self._empty]
+        return [divmod(cell, self.size) for cell in self._empty]
+
+
+    def random_legal_move(self, rng: np.random.Generator) -> tuple[int, int]:
+        """A uniformly random empty cell in the current orientation, in O(1)"""
+        if self.winner is not None:
+            raise TerminatedError(self.winner, rich=self.rich_exceptions)
+        cell = self._empty[rng.integers(len(self._empty))]
+        if self.inversed:
+            cell = get_inverse_table(self.size)[cell]
+        return divmod(cell, self.size)
+
+
     def _get_neighbors(self, tup_action: tuple[int, int]) -> list[tuple[int, int]]:
         x, y = tup_action
         neighbors = [
@@ -110,39 +289,147 @@ class Hex:
         ))
 
 
-    def _add_to_and_merge_groups(self, tup_action: tuple[int, int]) -> None:
-        if self.board[tup_action] == 1:
-            self._first_groups = self._merge_groups(tup_action, self._first_groups)
+    def _find(self, node: int) -> int:
+        parent = self._parent
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        # path compression, logged so that it can be undone
+        while parent[node] != root:
+            self._trail.append((node, parent[node], self._rank[node]))
+            parent[node], node = root, parent[node]
+        return root
+
+
+    def _union(self, node_1: int, node_2: int) -> None:
+        root_1, root_2 = self._find(node_1), self._find(node_2)
+        if root_1 == root_2:
+            return
+        # union by rank
+        rank = self._rank
+        if rank[root_1] < rank[root_2]:
+            root_1, root_2 = root_2, root_1
+        self._trail.append((root_2, root_2, rank[root_2]))
+        self._parent[root_2] = root_1
+        if rank[root_1] == rank[root_2]:
+            self._trail.append((root_1, root_1, rank[root_1]))
+            rank[root_1] += 1
+
+
+    def _place(self, cell: int, stone: int) -> None:
+        # cell and stone are in the original orientation
+        self._flat_boards[0][cell] = stone
+        self._flat_boards[1][get_inverse_table(self.size)[cell]] = -stone
+        self._toggle_keys(cell, stone)
+        self._union_neighbors(cell, stone)
+
+        empty, empty_position = self._empty, self._empty_position
+        last = empty[-1]
+        empty[empty_position[cell]] = last
+        empty_position[last] = empty_position[cell]
+        empty.pop()
+
+
+    def _toggle_keys(self, cell: int, stone: int) -> None:
+        # adds or removes the stone, cell and stone are in the original orientation
+        self._keys[0] ^= self._zobrist[stone][cell]
+        self._keys[1] ^= self._zobrist[-stone][get_inverse_table(self.size)[cell]]
+
+
+    def unplay(self) -> None:
+        """Takes back the last move, restoring the board, player, winner and connectivity"""
+        if not self._history:
+            raise EmptyHistoryError(rich=self.rich_exceptions)
+
+        cell, trail_length = self._history.pop()
+        stone = int(self._flat_boards[0][cell])
+        self._flat_boards[0][cell] = 0
+        self._flat_boards[1][get_inverse_table(self.size)[cell]] = 0
+        self._toggle_keys(cell, stone)
+
+        # the cell was swapped with the last empty cell, swap them back
+        empty, empty_position = self._empty, self._empty_position
+        position = empty_position[cell]
+        if position < len(empty):
+            moved = empty[position]
+            empty_position[moved] = len(empty)
+            empty.append(moved)
+            empty[position] = cell
         else:
-            self._second_groups = self._merge_groups(tup_action, self._second_groups)
-        
+            empty.append(cell)
+        empty_position[cell] = position
+
+        parent, rank, trail = self._parent, self._rank, self._trail
+        while len(trail) > trail_length:
+            node, old_parent, old_rank = trail.pop()
+            parent[node] = old_parent
+            rank[node] = old_rank
+
+        # no move can be played after the game ended, so there was no winner before it
+        self.winner = None
+        self.player = -stone if self.inversed else stone
+
+
+    undo = unplay
+
+
+    @contextmanager
+    def try_move(self, tup_action: tuple[int, int]) -> Iterator["Hex"]:
+        """
+        Plays a move for the duration of a with block, then takes it back
+            with hex.try_move((row, col)):
+                ...
+        """
+        self.play(tup_action)
+        try:
+            yield self
+        finally:
+            self.unplay()
+
+
+    def _union_neighbors(self, cell: int, stone: int) -> None:
+        # merge the new stone with the adjacent stones of the same player and edges
+        flat_board = self._flat_boards[0]
+        for neighbor in get_neighbor_table(self.size)[cell]:
+            if flat_board[neighbor] == stone:
+                self._union(cell, neighbor)
+        for edge in get_edge_table(self.size)[stone][cell]:
+            self._union(cell, edge)
 
-    def _merge_groups(self, tup_action: tuple[int, int], groups: list[set[tuple[int, int]]]
-                      ) -> list[set[tuple[int, int]]]:
-        neighbors = self._get_neighbors(tup_action)
-
-        new_group = {tup_action}
-        old_groups = list()
-        for neighbor in neighbors:
-            for group in groups:
-                if neighbor in group and group not in old_groups:
-                    old_groups.append(group)
-                    new_group |= group
-                    break
-        
-        for group in old_groups:
-            groups.remove(group)
-        groups.append(new_group)
 
+    def get_groups(self, player: int) -> list[set[tuple[int, int]]]:
+        """
+        Connected groups of stones of a player
+        Flood filled from the board, the disjoint-set also links groups through the edges
+        """
+        neighbor_table = get_neighbor_table(self.size)
+        flat_board = self.board.reshape(-1)
+
+        groups = list()
+        visited = set()
+        for cell in np.flatnonzero(flat_board == player).tolist():
+            if cell in visited:
+                continue
+            visited.add(cell)
+            stack = [cell]
+            group = set()
+            while stack:
+                curr = stack.pop()
+                group.add(divmod(curr, self.size))
+                for neighbor in neighbor_table[curr]:
+                    if neighbor not in visited and flat_board[neighbor] == player:
+                        visited.add(neighbor)
+                        stack.append(neighbor)
+            groups.append(group)
         return groups
     
 
     def _print_groups(self) -> None:
         print("Red / X groups:")
-        for group in self._first_groups:
+        for group in self.get_groups(1):
             print(group)
         print("Blue / O groups:")
-        for group in self._second_groups:
+        for group in self.get_groups(-1):
             print(group)
 
 
@@ -169,117 +456,68 @@ class Hex:
 
 
     def rich_print(self) -> None:
+        # rich is only needed to print, imported here to keep importing hex fast
+        from rich.console import Console
         console = Console(highlight=False)
         console.print(self.get_rich_str())
     
 
     def check_winner(self) -> Optional[int]:
-        if not self.inversed:
-            for group in self._first_groups:
-                if any(tup_action[0] == 0 for tup_action in group) and \
-                    any(tup_action[0] == self.size - 1 for tup_action in group):
-                    return 1
-            for group in self._second_groups:
-                if any(tup_action[1] == 0 for tup_action in group) and \
-                    any(tup_action[1] == self.size - 1 for tup_action in group):
-                    return -1
-        else:
-            for group in self._first_groups:
-                if any(tup_action[1] == 0 for tup_action in group) and \
-                    any(tup_action[1] == self.size - 1 for tup_action in group):
-                    return 1
-            for group in self._second_groups:
-                if any(tup_action[0] == 0 for tup_action in group) and \
-                    any(tup_action[0] == self.size - 1 for tup_action in group):
-                    return -1
+        # the disjoint-set is in the original orientation, where the players are swapped if inversed
+        n_cells = self.size * self.size
+        if self._find(n_cells + TOP) == self._find(n_cells + BOTTOM):
+            return -1 if self.inversed else 1
+        if self._find(n_cells + LEFT) == self._find(n_cells + RIGHT):
+            return 1 if self.inversed else -1
         return None
     
 
     def get_winner_group(self) -> Optional[set[tuple[int, int]]]:
-        if not self.inversed:
-            if self.winner == 1:
-                for group in self._first_groups:
-                    if any(tup_action[0] == 0 for tup_action in group) and \
-                        any(tup_action[0] == self.size - 1 for tup_action in group):
-                        return group
-            elif self.winner == -1:
-                for group in self._second_groups:
-                    if any(tup_action[1] == 0 for tup_action in group) and \
-                        any(tup_action[1] == self.size - 1 for tup_action in group):
-                        return group
-        else:
-            if self.winner == 1:
-                for group in self._first_groups:
-                    if any(tup_action[1] == 0 for tup_action in group) and \
-                        any(tup_action[1] == self.size - 1 for tup_action in group):
-                        return group
-            elif self.winner == -1:
-                for group in self._second_groups:
-                    if any(tup_action[0] == 0 for tup_action in group) and \
-                        any(tup_action[0] == self.size - 1 for tup_action in group):
-                        return group
+        if self.winner == 1:
+            for group in self.get_groups(1):
+                if any(tup_action[0] == 0 for tup_action in group) and \
+                    any(tup_action[0] == self.size - 1 for tup_action in group):
+                    return group
+        elif self.winner == -1:
+            for group in self.get_groups(-1):
+                if any(tup_action[1] == 0 for tup_action in group) and \
+                    any(tup_action[1] == self.size - 1 for tup_action in group):
+                    return group
         return None
     
 
     def inverse(self) -> None:
-        self.board = np.rot90(np.transpose(self.board * -1), k=2)
+        # both orientations of the board are maintained by play(),
+        # and the disjoint-set always stays in the original orientation
         self.player *= -1
-
-        self._first_groups, self._second_groups = self._second_groups, self._first_groups
-
-        _new_first_groups = list()
-        _new_second_groups = list()
-
-        for group in self._first_groups:
-            _new_group = set()
-            for tup in group:
-                _new_group.add((self.size - 1 - tup[1], self.size - 1 - tup[0]))
-            _new_first_groups.append(_new_group)
-
-        for group in self._second_groups:
-            _new_group = set()
-            for tup in group:
-                _new_group.add((self.size - 1 - tup[1], self.size - 1 - tup[0]))
-            _new_second_groups.append(_new_group)
-
-        self._first_groups = _new_first_groups
-        self._second_groups = _new_second_groups
-        
+        if self.winner is not None:
+            self.winner *= -1
         self.inversed = not self.inversed
 
 
     def _get_shortest_path(self, group: set[tuple[int, int]],
-                          start: tuple[int, int], end: tuple[int, int],
-                          ) -> list[tuple[int, int]]:
-        # return the shortest path from start to end in the group
-        # print(start, end)
-        # print(sorted(list(group)))
-        
-        assert start in group
-        assert end in group
+                          starts: list[tuple[int, int]], ends: list[tuple[int, int]],
+                          ) -> Optional[list[tuple[int, int]]]:
+        # return the shortest path from any start to any end in the group
+        # multi-source breadth-first search, every cell is visited at most once
+        ends = set(ends)
+        previous: dict[tuple[int, int], Optional[tuple[int, int]]] = {start: None for start in starts}
+        queue = deque(starts)
+        while queue:
+            curr = queue.popleft()
+            if curr in ends:
+                path = list()
+                while curr is not None:
+                    path.append(curr)
+                    curr = previous[curr]
+                return path[::-1]
+
+            for neighbor in self._get_neighbors(curr):
+                if neighbor in group and neighbor not in previous:
+                    previous[neighbor] = curr
+                    queue.append(neighbor)
 
-        if start == end:
-            # print('return', [start])
-            return [start]
-        
-        min_length = None
-        min_path = None
-        for neighbor in self._get_neighbors(start):
-            if neighbor not in group:
-                continue
-
-            # if neighbor == end:
-            #     return [start, end]
-            
-            shortest_path_from_neighbor = self._get_shortest_path(
-                group=group-{start}, start=neighbor, end=end)
-            if shortest_path_from_neighbor is not None:
-                if min_length is None or len(shortest_path_from_neighbor) < min_length:
-                    min_length = 1 + len(shortest_path_from_neighbor)
-                    min_path = [start] + shortest_path_from_neighbor
-
-        # print('return', min_path)
-        return min_path
+        return None
 
     
     def get_shortest_group_path(self, group: set[tuple[int, int]], orientation: str
@@ -294,30 +532,17 @@ class Hex:
         else:
             starts = [tup for tup in group if tup[1] == 0]
             ends = [tup for tup in group if tup[1] == self.size - 1]
-        
-        min_length = None
-        min_path = None
-        for start in starts:
-            for end in ends:
-                shortest_path_start_end = self._get_shortest_path(group, start, end)
-                if min_length is None or len(shortest_path_start_end) < min_length:
-                    min_length = len(shortest_path_start_end)
-                    min_path = shortest_path_start_end
-
-        return min_path
+
+        return self._get_shortest_path(group, starts, ends)
     
 
     def get_winner_shortest_path(self):
-        if not self.inversed:
-            if self.winner == 1:
-                return self.get_shortest_group_path(self.get_winner_group(), 'v')
-            elif self.winner == -1:
-                return self.get_shortest_group_path(self.get_winner_group(), 'h')
-        else:
-            if self.winner == 1:
-                return self.get_shortest_group_path(self.get_winner_group(), 'h')
-            elif self.winner == -1:
-                return self.get_shortest_group_path(self.get_winner_group(), 'v')
+        if self.winner is None:
+            return None
+        # searching all stones of the winner gives the same path as its winning group,
+        # the inversed board keeps the orientation: 1 is vertical, -1 is horizontal
+        stones = {(int(row), int(col)) for row, col in zip(*np.nonzero(self.board == self.winner))}
+        return self.get_shortest_group_path(stones, 'v' if self.winner == 1 else 'h')
     
 
     @staticmethod
@@ -489,7 +714,7 @@ if __name__ == "__main__":
     # _hex.play((5, 5))   # TerminatedError: Game already ended, the winner is O
     path = _hex._get_shortest_path(
         {(0, 0), (0, 1), (0, 2), (0, 3), (0, 4), (0, 5), (1, 0)},
-        (0, 0), (0, 5))
+        [(0, 0)], [(0, 5)])
     print('Path')
     print(path)
     print('Length', len(path) - 1)
@@ -0,0 +1,162 @@
+import numpy as np
+from typing import Optional
+
+from hex import Hex, InvalidSizeError, InvalidActionError, TerminatedError, inverse_board
+
+
+def connected(stones: np.ndarray) -> np.ndarray:
+    """
+    Whether the stones of every board connect the upper and lower edges
+    stones: (N, size, size) bool, returns (N,) bool
+    Grows the stones reached from the upper edge by masked dilation until nothing changes
+    """
+    reached = np.zeros_like(stones)
+    reached[:, 0, :] = stones[:, 0, :]
+    # boards that can still grow, the others are done
+    active = np.flatnonzero(reached[:, 0, :].any(axis=1))
+    while active.size:
+        curr = reached[active]
+        grown = curr.copy()
+        grown[:, 1:, :] |= curr[:, :-1, :]        # from (row - 1, col)
+        grown[:, 1:, :-1] |= curr[:, :-1, 1:]     # from (row - 1, col + 1)
+        grown[:, :, 1:] |= curr[:, :, :-1]        # from (row, col - 1)
+        grown[:, :, :-1] |= curr[:, :, 1:]        # from (row, col + 1)
+        grown[:, :-1, 1:] |= curr[:, 1:, :-1]     # from (row + 1, col - 1)
+        grown[:, :-1, :] |= curr[:, 1:, :]        # from (row + 1, col)
+        grown &= stones[active]
+
+        changed = (grown != curr).any(axis=(1, 2))
+        reached[active] = grown
+        # stop growing the boards that already reached the lower edge
+        changed &= ~grown[:, -1, :].any(axis=1)
+        active = active[changed]
+
+    return reached[:, -1, :].any(axis=1)
+
+
+def winners_of(boards: np.ndarray) -> np.ndarray:
+    """
+    Winner of every board, 0 if no one
+    Player 1 connects the upper & lower edges, player -1 the left & right edges
+    The transpose keeps the hexagonal neighborhood, so -1 is checked on the transposed boards
+    """
+    winners = np.zeros(len(boards), dtype=np.int8)
+    winners[connected(boards == 1)] = 1
+    winners[connected((boards == -1).transpose(0, 2, 1))] = -1
+    return winners
+
+
+
+class BatchHex:
+    """N Hex games played at once, with the same players and orientation as Hex"""
+
+    def __init__(self, n_boards: int, size: int) -> None:
+        """
+        Parameters:
+        n_boards
+            Number of simultaneous games
+        size
+            Must be between Hex.LOWER_SIZE_LIMIT and Hex.UPPER_SIZE_LIMIT
+
+        Unlike Hex, winners are stored as 0 while the game is not terminated
+        """
+        if not Hex.LOWER_SIZE_LIMIT <= size <= Hex.UPPER_SIZE_LIMIT:
+            raise InvalidSizeError(size, Hex.LOWER_SIZE_LIMIT, Hex.UPPER_SIZE_LIMIT)
+
+        self.n_boards = n_boards
+        self.size = size
+        self.inversed = False
+
+        self.boards = np.zeros((n_boards, size, size), dtype=np.int8)
+        self.players = np.ones(n_boards, dtype=np.int8)
+        self.winners = np.zeros(n_boards, dtype=np.int8)
+
+
+    def reset(self, mask: Optional[np.ndarray] = None) -> None:
+        """Resets all boards, or only the boards selected by the (N,) bool mask"""
+        if mask is None:
+            mask = np.ones(self.n_boards, dtype=bool)
+        self.boards[mask] = 0
+        # the first player appears as -1 on an inversed board
+        self.players[mask] = -1 if self.inversed else 1
+        self.winners[mask] = 0
+
+
+    @property
+    def terminated(self) -> np.ndarray:
+        return self.winners != 0
+
+
+    def legal_moves(self) -> np.ndarray:
+        """(N, size * size) bool mask of the empty cells, all False on terminated boards"""
+        legal = self.boards.reshape(self.n_boards, -1) == 0
+        legal &= ~self.terminated[:, None]
+        return legal
+
+
+    def play(self, actions: np.ndarray, mask: Optional[np.ndarray] = None) -> None:
+        """
+        Plays one move on every board, or only on the boards selected by the (N,) bool mask
+        actions: (N,) flat actions row * size + col, or (N, 2) rows and columns
+        """
+        actions = np.asarray(actions)
+        if actions.ndim == 2:
+            actions = actions[:, 0] * self.size + actions[:, 1]
+        indices = np.arange(self.n_boards) if mask is None else np.flatnonzero(mask)
+        rows, cols = np.divmod(actions[indices], self.size)
+
+        terminated = self.winners[indices] != 0
+        if terminated.any():
+            raise TerminatedError(int(self.winners[indices[terminated][0]]))
+        invalid = self.boards[indices, rows, cols] != 0
+        if invalid.any():
+            first = np.flatnonzero(invalid)[0]
+            raise InvalidActionError((int(rows[first]), int(cols[first])),
+                                     int(self.players[indices[first]]))
+
+        players = self.players[indices]
+        self.boards[indices, rows, cols] = players
+
+        # only the player who just moved can have won
+        stones = self.boards[indices] == players[:, None, None]
+        second = players == -1
+        stones[second] = stones[second].transpose(0, 2, 1)
+        won = connected(stones)
+        self.winners[indices[won]] = players[won]
+
+        self.players[indices] *= -1
+
+
+    def check_winners(self) -> np.ndarray:
+        return winners_of(self.boards)
+
+
+    def inverse(self) -> None:
+        """Inverses every board at once, see Hex.inverse"""
+        self.boards = np.ascontiguousarray(inverse_board(self.boards))
+        self.players *= -1
+        self.winners *= -1
+        self.inversed = not self.inversed
+
+
+
+if __name__ == "__main__":
+    import time
+
+    n_boards, size = 1000, 11
+    batch = BatchHex(n_boards, size)
+    rng = np.random.default_rng(0)
+
+    start = time.perf_counter()
+    n_moves = 0
+    while not batch.terminated.all():
+        legal = batch.legal_moves()
+        # uniformly random legal move on every running board
+        scores = np.where(legal, rng.random(legal.shape), -1)
+        actions = scores.argmax(axis=1)
+        batch.play(actions, mask=~batch.terminated)
+        n_moves += int(legal.any(axis=1).sum())
+    elapsed = time.perf_counter() - start
+
+    print(f'{n_boards} random games of size {size} in {elapsed:.2f}s, {n_moves / elapsed:.0f} moves/s')
+    print('Wins of 1:', int((batch.winners == 1).sum()), 'wins of -1:', int((batch.winners == -1).sum()))
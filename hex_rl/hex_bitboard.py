@@ -0,0 +1,202 @@
+import numpy as np
+from typing import NamedTuple, Optional
+
+from hex import Hex, InvalidSizeError, InvalidActionError, TerminatedError
+
+
+class _Masks(NamedTuple):
+    full: int
+    not_first_col: int
+    not_last_col: int
+    first_row: int
+    last_row: int
+    first_col: int
+    last_col: int
+
+
+_MASKS: dict[int, _Masks] = dict()
+
+
+def get_masks(size: int) -> _Masks:
+    """Row and column bit masks, computed once per size"""
+    if size not in _MASKS:
+        first_row = (1 << size) - 1
+        first_col = sum(1 << (row * size) for row in range(size))
+        full = (1 << (size * size)) - 1
+        _MASKS[size] = _Masks(
+            full=full,
+            not_first_col=full & ~first_col,
+            not_last_col=full & ~(first_col << (size - 1)),
+            first_row=first_row,
+            last_row=first_row << (size * (size - 1)),
+            first_col=first_col,
+            last_col=first_col << (size - 1),
+        )
+    return _MASKS[size]
+
+
+class BitBoard:
+    """
+    Hex position as one bitset per player, cell (row, col) is bit row * size + col
+    Same rules and players as Hex, but copy, hash and compare are a few integer operations
+    """
+    __slots__ = ('size', 'first', 'second', 'player', 'winner')
+
+    def __init__(self, size: int, first: int = 0, second: int = 0, player: int = 1,
+                 winner: Optional[int] = None) -> None:
+        """
+        Parameters:
+        first, second
+            Bitsets of the stones of player 1 (upper & lower edges)
+            and player -1 (left & right edges)
+        player
+            The player to move
+        """
+        if not Hex.LOWER_SIZE_LIMIT <= size <= Hex.UPPER_SIZE_LIMIT:
+            raise InvalidSizeError(size, Hex.LOWER_SIZE_LIMIT, Hex.UPPER_SIZE_LIMIT)
+
+        self.size = size
+        self.first = first
+        self.second = second
+        self.player = player
+        self.winner = winner
+
+
+    @classmethod
+    def from_array(cls, board: np.ndarray, player: int = 1) -> "BitBoard":
+        """Builds the bitboard of a (size, size) board of 1, -1 and 0"""
+        size = board.shape[-1]
+        bitboard = cls(size,
+                       first=cls.pack(board.reshape(-1) == 1),
+                       second=cls.pack(board.reshape(-1) == -1),
+                       player=player)
+        bitboard.winner = bitboard.check_winner()
+        return bitboard
+
+
+    @classmethod
+    def from_hex(cls, hex: Hex) -> "BitBoard":
+        return cls.from_array(hex.board, player=hex.player)
+
+
+    @staticmethod
+    def pack(cells: np.ndarray) -> int:
+        """Bitset of a flat bool array of the cells"""
+        return int.from_bytes(np.packbits(cells, bitorder='little').tobytes(), 'little')
+
+
+    def _unpack(self, bits: int) -> np.ndarray:
+        n_cells = self.size * self.size
+        buffer = bits.to_bytes((n_cells + 7) // 8, 'little')
+        return np.unpackbits(np.frombuffer(buffer, dtype=np.uint8), count=n_cells, bitorder='little')
+
+
+    def to_array(self) -> np.ndarray:
+        """The (size, size) board with the same values and dtype as Hex.board"""
+        board = self._unpack(self.first).astype(int) - self._unpack(self.second)
+        return board.reshape(self.size, self.size)
+
+
+    def copy(self) -> "BitBoard":
+        return BitBoard(self.size, self.first, self.second, self.player, self.winner)
+
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, BitBoard):
+            return NotImplemented
+        return (self.size == other.size and self.first == other.first
+                and self.second == other.second and self.player == other.player)
+
+
+    def __hash__(self) -> int:
+        return hash((self.size, self.first, self.second, self.player))
+
+
+    def __repr__(self) -> str:
+        return f"BitBoard(size={self.size}, first={self.first:#x}, second={self.second:#x}, player={self.player})"
+
+
+    @property
+    def empty(self) -> int:
+        return get_masks(self.size).full & ~(self.first | self.second)
+
+
+    def is_valid_action(self, tup_action: tuple[int, int]) -> bool:
+        row, col = tup_action
+        return not (self.first | self.second) >> (row * self.size + col) & 1
+
+
+    def play(self, tup_action: tuple[int, int]) -> None:
+        if self.winner is not None:
+            raise TerminatedError(self.winner)
+
+        if not self.is_valid_action(tup_action):
+            raise InvalidActionError(tup_action, self.player)
+
+        row, col = tup_action
+        bit = 1 << (row * self.size + col)
+        if self.player == 1:
+            self.first |= bit
+        else:
+            self.second |= bit
+
+        if self._is_connected(self.player):
+            self.winner = self.player
+
+        self.player *= -1
+
+
+    def expand(self, bits: int) -> int:
+        """The cells in bits and all of their neighbors, one shift per direction"""
+        size = self.size
+        masks = get_masks(size)
+        right = bits & masks.not_last_col
+        left = bits & masks.not_first_col
+        return (bits
+                | bits >> size                            # (row - 1, col)
+                | right >> (size - 1)                     # (row - 1, col + 1)
+                | left >> 1                               # (row, col - 1)
+                | right << 1                              # (row, col + 1)
+                | (left << (size - 1)) & masks.full       # (row + 1, col - 1)
+                | (bits << size) & masks.full)            # (row + 1, col)
+
+
+    def flood_fill(self, stones: int, seeds: int) -> int:
+        """The stones connected to the seeds"""
+        reached = seeds & stones
+        while True:
+            grown = self.expand(reached) & stones
+            if grown == reached:
+                return reached
+            reached = grown
+
+
+    def _is_connected(self, player: int) -> bool:
+        masks = get_masks(self.size)
+        if player == 1:
+            return bool(self.flood_fill(self.first, masks.first_row) & masks.last_row)
+        return bool(self.flood_fill(self.second, masks.first_col) & masks.last_col)
+
+
+    def check_winner(self) -> Optional[int]:
+        if self._is_connected(1):
+            return 1
+        if self._is_connected(-1):
+            return -1
+        return None
+
+
+
+if __name__ == "__main__":
+    _hex = Hex(5)
+    for action in [(0, 1), (1, 0), (1, 1), (2, 0), (2, 1), (3, 0), (3, 1), (4, 4), (4, 0)]:
+        _hex.play(action)
+    _hex.rich_print()
+
+    bitboard = BitBoard.from_hex(_hex)
+    print(bitboard)
+    print(bitboard.to_array())
+    print('Winner', bitboard.winner, _hex.winner)
+
+    clone = bitboard.copy()
+    print('Equal copy', clone == bitboard, hash(clone) == hash(bitboard))
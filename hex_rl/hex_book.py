@@ -0,0 +1,113 @@
+"""
+Opening books: the best move of the first positions of a game, precomputed once per size
+
+Agents play as player 1 and see the board of player -1 inversed, so every book position
+is a board with player 1 to move. A book is a .npy file of (key, move) records sorted by
+the Zobrist key of the position (see hex.board_key), memory-mapped when opened:
+opening it reads only the header, and a lookup is a binary search touching a few pages.
+"""
+
+import os
+import numpy as np
+from typing import Callable, Optional
+
+from hex import board_key
+
+
+BOOK_DTYPE = np.dtype([('key', '<u8'), ('move', '<u2')])
+
+
+class OpeningBook:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.entries = np.load(path, mmap_mode='r')
+        self._keys = self.entries['key']
+
+
+    @classmethod
+    def open(cls, path: Optional[str]) -> Optional["OpeningBook"]:
+        """The book at path, None if there is no such file"""
+        if path is None or not os.path.exists(path):
+            return None
+        return cls(path)
+
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+    def lookup(self, board: np.ndarray) -> Optional[tuple[int, int]]:
+        """The book move of player 1 on the board, None if the position is not in the book"""
+        key = board_key(board, 1)
+        index = int(np.searchsorted(self._keys, np.uint64(key)))
+        if index == len(self._keys) or int(self._keys[index]) != key:
+            return None
+        move = int(self.entries['move'][index])
+        size = board.shape[-1]
+        if board.flat[move] != 0:
+            return None
+        return divmod(move, size)
+
+
+
+def build_book(predict: Callable[[np.ndarray], tuple[int, int]], size: int, n_plies: int, path: str) -> int:
+    """
+    Writes the book of the moves of predict, a function of a board with player 1 to move,
+    for every position of fewer than n_plies stones reachable when player 1 follows the book,
+    whether player 1 moves first or second. Returns the number of positions.
+    """
+    book: dict[int, int] = dict()
+
+    def add(board: np.ndarray) -> None:
+        # the book move, then every reply of player -1
+        if np.count_nonzero(board) >= n_plies:
+            return
+        key = board_key(board, 1)
+        if key in book:
+            return
+        row, col = predict(board)
+        book[key] = row * size + col
+        after_move = board.copy()
+        after_move[row, col] = 1
+        if np.count_nonzero(after_move) >= n_plies:
+            return
+        for reply in np.flatnonzero(after_move.reshape(-1) == 0):
+            after_reply = after_move.copy()
+            after_reply.flat[reply] = -1
+            add(after_reply)
+
+    empty = np.zeros((size, size), dtype=int)
+    add(empty)
+    # player 1 moving second, after every first move of player -1
+    for first_move in range(size * size):
+        board = empty.copy()
+        board.flat[first_move] = -1
+        add(board)
+
+    entries = np.zeros(len(book), dtype=BOOK_DTYPE)
+    entries['key'] = np.fromiter(book.keys(), dtype=np.uint64, count=len(book))
+    entries['move'] = np.fromiter(book.values(), dtype=np.uint16, count=len(book))
+    entries.sort(order='key')
+    np.save(path, entries)
+    return len(entries)
+
+
+
+if __name__ == '__main__':
+    import time
+    from model_dqn import DQNModel
+    from model_dqn_search import DQNSearchModel
+
+    # the book of each DQN model, its moves searched deeper than the model plays them
+    size, n_plies = 5, 3
+    for level in ['easy', 'medium', 'hard']:
+        dqn_model = DQNModel(size=size, load_path=f'model/dqn_{level}_{size}')
+        search_model = DQNSearchModel(dqn_model, n_simulations=400)
+        start = time.perf_counter()
+        path = f'model/book_dqn_{level}_{size}.npy'
+        n_positions = build_book(search_model.predict, size, n_plies, path)
+        print(f'{path}: {n_positions} positions in {time.perf_counter() - start:.1f}s')
+
+    start = time.perf_counter()
+    book = OpeningBook(path)
+    print(f'Opened in {(time.perf_counter() - start) * 1000:.2f}ms, first move {book.lookup(np.zeros((size, size), dtype=int))}')
@@ -1,9 +1,5 @@
-from hex_cli_api import HexCLI
-
 import typer
 from typing_extensions import Annotated
-from rich.prompt import Prompt
-from rich.console import Console
 
 
 app = typer.Typer(add_completion=False, help='The complete Hex program with reinforcement learning.')
@@ -23,6 +19,8 @@ app.add_typer(play_app, name='play', help='Play (or spectate) a game of Hex in t
 def play_pvp(size: Annotated[int, typer.Option(help='Size of the board')] = 11,
              debug: Annotated[bool, typer.Option(help='Debug mode')] = False):
     """python hex_rl/hex_cli.py play pvp --size 5 --debug"""
+    # the game is imported by the commands only, --help does not need it
+    from hex_cli_api import HexCLI
     HexCLI(size=size, rich_exceptions=True).play_pvp_cli(debug=debug)
 
 
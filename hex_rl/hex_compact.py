@@ -0,0 +1,172 @@
+"""
+CompactHex: the Hex game in two flat typed arrays, for searches keeping many positions alive
+
+    _cells      array of int8, the stones in row-major order
+    _parent     array of int16, the disjoint-set forest over the cells and the four virtual edge nodes of Hex
+
+clone() copies both buffers and three scalars. There is no history, inversion or rich printing:
+a search clones a position instead of taking moves back. Convert with from_hex and to_hex
+when those are needed. The players, edges and Zobrist keys are those of Hex.
+"""
+
+import warnings
+from array import array
+import numpy as np
+from typing import Optional
+
+from hex import Hex, InvalidSizeError, InvalidActionError, TerminatedError, TOP, BOTTOM, LEFT, RIGHT, \
+    ZOBRIST_PLAYER, get_neighbor_table, get_edge_table, get_zobrist_table
+
+
+_ZOBRIST_LISTS: dict[int, dict[int, list[int]]] = dict()
+
+
+def _get_zobrist_lists(size: int) -> dict[int, list[int]]:
+    # the keys of the stones of every player as Python ints
+    if size not in _ZOBRIST_LISTS:
+        _ZOBRIST_LISTS[size] = {stone: keys.tolist() for stone, keys in zip((1, -1), get_zobrist_table(size))}
+    return _ZOBRIST_LISTS[size]
+
+
+
+class CompactHex:
+    """The Hex core game with __slots__ and flat typed arrays, play only"""
+    __slots__ = ('size', 'player', 'winner', '_cells', '_parent', '_key')
+
+    def __init__(self, size: int) -> None:
+        if not Hex.LOWER_SIZE_LIMIT <= size <= Hex.UPPER_SIZE_LIMIT:
+            raise InvalidSizeError(size, Hex.LOWER_SIZE_LIMIT, Hex.UPPER_SIZE_LIMIT)
+        if size % 2 == 0:
+            warnings.warn(f"The game is traditionally played on odd-sized board, got even size {size}")
+
+        self.size = size
+        self.player = 1
+        self.winner: Optional[int] = None
+        self._cells = array('b', bytes(size * size))
+        self._parent = array('h', range(size * size + 4))
+        self._key = 0
+
+
+    @classmethod
+    def from_board(cls, board: np.ndarray, player: int = 1) -> "CompactHex":
+        """The game at any (size, size) board of 1, -1 and 0, with player to move"""
+        hex = cls(board.shape[-1])
+        for cell in np.flatnonzero(board).tolist():
+            hex._place(cell, int(board.flat[cell]))
+        hex.player = player
+        hex.winner = hex.check_winner()
+        return hex
+
+
+    @classmethod
+    def from_hex(cls, hex: Hex) -> "CompactHex":
+        """The position of a Hex game, in its current orientation"""
+        return cls.from_board(hex.board, hex.player)
+
+
+    def to_hex(self) -> Hex:
+        return Hex.from_board(self.board.astype(int), self.player)
+
+
+    def clone(self) -> "CompactHex":
+        other = CompactHex.__new__(CompactHex)
+        other.size = self.size
+        other.player = self.player
+        other.winner = self.winner
+        other._cells = self._cells[:]
+        other._parent = self._parent[:]
+        other._key = self._key
+        return other
+
+
+    @property
+    def board(self) -> np.ndarray:
+        """(size, size) int8 view of the cells, not a copy"""
+        return np.frombuffer(self._cells, dtype=np.int8).reshape(self.size, self.size)
+
+
+    @property
+    def key(self) -> int:
+        """Zobrist key of the position including the player to move, equal to Hex.key"""
+        return self._key ^ ZOBRIST_PLAYER if self.player == -1 else self._key
+
+
+    def _find(self, node: int) -> int:
+        # path halving, every node visited points to its grandparent
+        parent = self._parent
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+
+    def _place(self, cell: int, stone: int) -> None:
+        self._cells[cell] = stone
+        self._key ^= _get_zobrist_lists(self.size)[stone][cell]
+        cells, parent = self._cells, self._parent
+        for node in [neighbor for neighbor in get_neighbor_table(self.size)[cell] if cells[neighbor] == stone] \
+                + get_edge_table(self.size)[stone][cell]:
+            root_1, root_2 = self._find(cell), self._find(node)
+            if root_1 != root_2:
+                parent[root_2] = root_1
+
+
+    def play(self, tup_action: tuple[int, int]) -> None:
+        if self.winner is not None:
+            raise TerminatedError(self.winner)
+        if not self.is_valid_action(tup_action):
+            raise InvalidActionError(tup_action, self.board[tup_action])
+
+        row, col = tup_action
+        self._place(row * self.size + col, self.player)
+        self.winner = self.check_winner()
+        self.player *= -1
+
+
+    def is_valid_action(self, tup_action: tuple[int, int]) -> bool:
+        row, col = tup_action
+        return 0 <= row < self.size and 0 <= col < self.size and self._cells[row * self.size + col] == 0
+
+
+    def legal_moves(self) -> list[tuple[int, int]]:
+        """The empty cells, none after the game ended"""
+        if self.winner is not None:
+            return list()
+        return [divmod(cell, self.size) for cell, stone in enumerate(self._cells) if stone == 0]
+
+
+    def check_winner(self) -> Optional[int]:
+        n_cells = self.size * self.size
+        if self._find(n_cells + TOP) == self._find(n_cells + BOTTOM):
+            return 1
+        if self._find(n_cells + LEFT) == self._find(n_cells + RIGHT):
+            return -1
+        return None
+
+
+
+if __name__ == '__main__':
+    import copy
+    import time
+    import tracemalloc
+
+    size, n_positions = 11, 100_000
+    rng = np.random.default_rng(0)
+    _hex = Hex(size)
+    for _ in range(20):
+        moves = _hex.legal_moves()
+        _hex.play(moves[rng.integers(len(moves))])
+    compact = CompactHex.from_hex(_hex)
+    assert compact.key == _hex.key and (compact.board == _hex.board).all()
+
+    for name, clone in [('Hex deepcopy', lambda: copy.deepcopy(_hex)), ('CompactHex.clone', compact.clone)]:
+        start = time.perf_counter()
+        for _ in range(1_000):
+            clone()
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        positions = [clone() for _ in range(n_positions // 10)]
+        memory = tracemalloc.get_traced_memory()[0] / len(positions)
+        tracemalloc.stop()
+        del positions
+        print(f'{name}: {elapsed * 1_000:.1f}us per copy, {memory:.0f} bytes per position on {size}x{size}')
@@ -0,0 +1,74 @@
+"""
+Startup budget of the entry modules, measured with python -X importtime in fresh interpreters
+
+    python hex_rl/hex_importtime.py
+
+Fails when a module takes longer than its budget to import, with everything it imports,
+or when it imports a heavy machine learning package: those are for the agents only,
+imported when one is loaded, see model_registry. tk_mainmenu opens its window on import,
+and imports pyg_hexagrid only when a game starts, so pyg_hexagrid stands for it.
+Modules with a dependency that is not installed are skipped, and the check is then incomplete:
+it fails as well, since a module that cannot be imported was not measured.
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+
+# milliseconds, the best of N_RUNS imports
+BUDGETS_MS = {
+    'hex': 400,
+    'hex_cli': 800,
+    'model_registry': 400,
+    'pyg_hexagrid': 1_000,
+}
+HEAVY_PACKAGES = {'torch', 'stable_baselines3', 'gymnasium'}
+N_RUNS = 3
+
+
+def import_times(module: str) -> dict[str, int]:
+    """Cumulative microseconds of every package imported by a fresh interpreter importing the module"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=Path(__file__).parent, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise ImportError(result.stderr.strip().splitlines()[-1])
+
+    times = dict()
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, package = line.split('|')
+        times[package.strip()] = int(cumulative)
+    return times
+
+
+def check_budgets(budgets: dict[str, int] = BUDGETS_MS, n_runs: int = N_RUNS) -> tuple[list[str], list[str]]:
+    """The failures and the skipped modules, printing the time of each module"""
+    failures, skipped = list(), list()
+    for module, budget in budgets.items():
+        try:
+            runs = [import_times(module) for _ in range(n_runs)]
+        except ImportError as error:
+            print(f'{module}: skipped, {error}')
+            skipped.append(module)
+            continue
+
+        elapsed = min(times[module] for times in runs) / 1_000
+        heavy = sorted(HEAVY_PACKAGES & runs[0].keys())
+        print(f'{module}: {elapsed:.1f}ms, budget {budget}ms' + (f', imports {", ".join(heavy)}' if heavy else ''))
+        if elapsed > budget:
+            failures.append(f'{module} takes {elapsed:.1f}ms to import, over its budget of {budget}ms')
+        if heavy:
+            failures.append(f'{module} imports {", ".join(heavy)}')
+    return failures, skipped
+
+
+
+if __name__ == '__main__':
+    failures, skipped = check_budgets()
+    assert not failures, '\n'.join(failures)
+    if skipped:
+        sys.exit(f'Incomplete, not measured: {", ".join(skipped)}')
+    print('All imports within budget')
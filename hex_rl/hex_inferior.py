@@ -0,0 +1,293 @@
+"""
+Inferior cell analysis: empty cells that never need to be played
+
+    dead        a cell whose color cannot change the winner. For each player, any two neighbors
+                a path of the player could use to cross the cell are already adjacent, so the path
+                can skip it.
+    captured    two adjacent empty cells of a player: if the opponent plays one, the player answers
+                with the other and the first becomes dead, so the player owns both already.
+                Pairs are kept disjoint.
+    dominated   an empty cell that a move of the player on an adjacent empty cell, its killer, makes dead.
+                The killer is at least as good for the player: after it the cell can be filled with a
+                stone of the player, and an extra stone never hurts. Depends on the player to move.
+    inferior    for the player to move, dead cells and the captured cells of both players.
+                Playing a captured cell of the opponent is a wasted move,
+                and a captured cell of the player itself is already won.
+    pruned      the inferior cells, and the dominated cells of the player to move whose killer is kept,
+                neither inferior nor dominated, so a chain or a cycle of dominations keeps one move.
+
+The tests only look at the six neighbors of a cell, so a stone changes the analysis
+within two cells of it, and InferiorCells updates only that region after each move.
+The edges count as stones of their player, player 1 owns the upper & lower edges as in Hex.
+"""
+
+import numpy as np
+from typing import Optional
+
+from hex import get_neighbor_table
+
+
+# what lies beyond the board around a cell: the edges of player 1, of player -1, or both beyond a corner
+EDGE_1, EDGE_2, EDGE_BOTH = -1, -2, -3
+
+# digit of every neighbor in the code of a ring: empty, stone of 1 or its edge, stone of -1 or its edge, both edges
+_DIGITS = {0: 0, 1: 1, -1: 2, EDGE_1: 1, EDGE_2: 2, EDGE_BOTH: 3}
+
+_RINGS: dict[int, list[list[int]]] = dict()
+_RING_CODES: dict[int, list[tuple[int, list[tuple[int, int]]]]] = dict()
+_REGIONS: dict[int, list[list[int]]] = dict()
+_DEAD_TABLE: list[bool] = list()
+
+
+def get_ring_table(size: int) -> list[list[int]]:
+    """
+    The six neighbors of every cell in circular order, consecutive ones are adjacent to each other
+    Beyond the board, EDGE_1 for the upper & lower edges, EDGE_2 for the left & right edges,
+    EDGE_BOTH beyond a corner touching both
+    """
+    if size not in _RINGS:
+        table = list()
+        for row in range(size):
+            for col in range(size):
+                ring = list()
+                for r, c in [(row - 1, col), (row - 1, col + 1), (row, col + 1),
+                             (row + 1, col), (row + 1, col - 1), (row, col - 1)]:
+                    off_rows, off_cols = not 0 <= r < size, not 0 <= c < size
+                    if off_rows and off_cols:
+                        ring.append(EDGE_BOTH)
+                    elif off_rows:
+                        ring.append(EDGE_1)
+                    elif off_cols:
+                        ring.append(EDGE_2)
+                    else:
+                        ring.append(r * size + c)
+                table.append(ring)
+        _RINGS[size] = table
+    return _RINGS[size]
+
+
+def _get_ring_codes(size: int) -> list[tuple[int, list[tuple[int, int]]]]:
+    # the fixed part of the code of every ring, from the edges, and the weight of every neighbor cell
+    if size not in _RING_CODES:
+        table = list()
+        for ring in get_ring_table(size):
+            edge_code = sum(_DIGITS[neighbor] * 4 ** position
+                            for position, neighbor in enumerate(ring) if neighbor < 0)
+            table.append((edge_code, [(neighbor, 4 ** position)
+                                      for position, neighbor in enumerate(ring) if neighbor >= 0]))
+        _RING_CODES[size] = table
+    return _RING_CODES[size]
+
+
+def get_region_table(size: int) -> list[list[int]]:
+    """The cells within two cells of every cell, itself included"""
+    if size not in _REGIONS:
+        neighbor_table = get_neighbor_table(size)
+        table = list()
+        for cell in range(size * size):
+            region = {cell, *neighbor_table[cell]}
+            for neighbor in neighbor_table[cell]:
+                region.update(neighbor_table[neighbor])
+            table.append(sorted(region))
+        _REGIONS[size] = table
+    return _REGIONS[size]
+
+
+def _is_useless(digits: list[int], player: int) -> bool:
+    """Whether no path of the player needs a cell with these digits of its ring"""
+    own = 1 if player == 1 else 2
+    # per position: 0 blocked, 1 owned by the player, 2 empty
+    states = [2 if digit == 0 else 1 if digit == own or digit == 3 else 0 for digit in digits]
+
+    # units a path can enter or leave by: runs of owned positions, and single empty cells
+    if 0 not in states and 2 not in states:
+        return True
+    # starting at a position that is not owned, no run crosses the start
+    start = states.index(0) if 0 in states else states.index(2)
+    units: list[list[int]] = list()
+    for offset in range(6):
+        position = (start + offset) % 6
+        state = states[position]
+        if state == 0:
+            continue
+        if state == 1 and units and states[(position - 1) % 6] == 1:
+            units[-1].append(position)
+        else:
+            units.append([position])
+
+    # every two units must touch
+    for i in range(len(units)):
+        for j in range(i + 1, len(units)):
+            if not any((a - b) % 6 in (1, 5) for a in units[i] for b in units[j]):
+                return False
+    return True
+
+
+def _get_dead_table() -> list[bool]:
+    # whether a cell is dead, for each of the 4 ** 6 codes of its ring
+    if not _DEAD_TABLE:
+        for code in range(4 ** 6):
+            digits = [code // 4 ** position % 4 for position in range(6)]
+            _DEAD_TABLE.append(_is_useless(digits, 1) and _is_useless(digits, -1))
+    return _DEAD_TABLE
+
+
+def is_dead(cell: int, flat_board, size: int) -> bool:
+    """Whether the cell is dead, whatever its own stone, one table lookup"""
+    edge_code, weights = _get_ring_codes(size)[cell]
+    code = edge_code
+    for neighbor, weight in weights:
+        stone = flat_board[neighbor]
+        if stone:
+            code += weight if stone == 1 else 2 * weight
+    return _get_dead_table()[code]
+
+
+
+class InferiorCells:
+    def __init__(self, board: np.ndarray) -> None:
+        """
+        Analysis of a (size, size) board, kept up to date by update after every stone placed or removed
+            analysis = InferiorCells(hex.board)
+            hex.play(action)
+            analysis.update(hex.board, action)
+            hex.unplay()
+            analysis.undo()
+        undo restores the analysis before the last update, cheaper than another update
+        """
+        self.size = board.shape[-1]
+        self.dead: set[int] = set()
+        # partner of every captured cell, per player
+        self.captured: dict[int, dict[int, int]] = {1: dict(), -1: dict()}
+        # killer of every dominated cell, per player, neither dead nor captured
+        self.dominated: dict[int, dict[int, int]] = {1: dict(), -1: dict()}
+        self._flat_board = board.reshape(-1).tolist()
+        self._recompute(range(self.size * self.size))
+        # cell, its stone, the dead, captured and dominated cells before every update
+        self._undo_stack: list[tuple[int, int, set[int], dict[int, dict[int, int]], dict[int, dict[int, int]]]] = list()
+
+
+    def _kills(self, killer: int, cell: int, player: int) -> bool:
+        # whether a stone of the player on the killer makes the cell dead, both are empty and adjacent
+        flat_board = self._flat_board
+        flat_board[killer] = player
+        dead = is_dead(cell, flat_board, self.size)
+        flat_board[killer] = 0
+        return dead
+
+
+    def _captures(self, cell: int, partner: int, player: int) -> bool:
+        # cell and partner are empty and adjacent
+        return self._kills(cell, partner, player) and self._kills(partner, cell, player)
+
+
+    def _recompute(self, cells) -> None:
+        flat_board, size = self._flat_board, self.size
+        neighbor_table = get_neighbor_table(size)
+        cells = list(cells)
+
+        for cell in cells:
+            self.dead.discard(cell)
+            if flat_board[cell] == 0 and is_dead(cell, flat_board, size):
+                self.dead.add(cell)
+
+        for player, partners in self.captured.items():
+            for cell in cells:
+                partner = partners.pop(cell, None)
+                if partner is not None:
+                    del partners[partner]
+            for cell in cells:
+                if flat_board[cell] != 0 or cell in partners or cell in self.dead:
+                    continue
+                for neighbor in neighbor_table[cell]:
+                    if flat_board[neighbor] == 0 and neighbor not in partners and neighbor not in self.dead \
+                            and self._captures(cell, neighbor, player):
+                        partners[cell], partners[neighbor] = neighbor, cell
+                        break
+
+        captured = self.captured[1].keys() | self.captured[-1].keys()
+        for player, killers in self.dominated.items():
+            for cell in cells:
+                killers.pop(cell, None)
+                if flat_board[cell] != 0 or cell in self.dead or cell in captured:
+                    continue
+                for neighbor in neighbor_table[cell]:
+                    if flat_board[neighbor] == 0 and self._kills(neighbor, cell, player):
+                        killers[cell] = neighbor
+                        break
+
+
+    def update(self, board: np.ndarray, tup_action: tuple[int, int]) -> None:
+        """After a stone is placed on or removed from the cell, board is the new board"""
+        row, col = tup_action
+        cell = row * self.size + col
+        self._undo_stack.append((cell, self._flat_board[cell], self.dead.copy(),
+                                 {player: partners.copy() for player, partners in self.captured.items()},
+                                 {player: killers.copy() for player, killers in self.dominated.items()}))
+        self._flat_board[cell] = int(board[row, col])
+        region = get_region_table(self.size)[cell]
+        # pairs reaching out of the region are dropped with it, their other cell is recomputed too
+        affected = set(region)
+        for partners in self.captured.values():
+            affected.update(partners[cell] for cell in region if cell in partners)
+        self._recompute(sorted(affected))
+
+
+    def undo(self) -> None:
+        cell, stone, self.dead, self.captured, self.dominated = self._undo_stack.pop()
+        self._flat_board[cell] = stone
+
+
+    def inferior_moves(self) -> set[int]:
+        """Flat indices of the inferior empty cells, the same for both players"""
+        return self.dead | self.captured[1].keys() | self.captured[-1].keys()
+
+
+    def dominated_moves(self, player: int) -> set[int]:
+        """Flat indices of the dominated cells of the player whose killer is neither inferior nor dominated"""
+        inferior, killers = self.inferior_moves(), self.dominated[player]
+        return {cell for cell, killer in killers.items() if killer not in inferior and killer not in killers}
+
+
+    def pruned_moves(self, legal_moves: list[int], player: Optional[int] = None) -> list[int]:
+        """
+        The legal moves that are neither inferior nor dominated for the player to move,
+        or all of them if every one is. Dominated moves are kept if player is None
+        """
+        pruned = self.inferior_moves()
+        if player is not None:
+            pruned |= self.dominated_moves(player)
+        moves = [move for move in legal_moves if move not in pruned]
+        return moves if moves else legal_moves
+
+
+
+def inferior_mask(board: np.ndarray, player: Optional[int] = None) -> np.ndarray:
+    """
+    (size, size) bool array of the inferior empty cells of a board, computed from scratch,
+    and of the dominated cells of the player to move unless player is None
+    """
+    analysis = InferiorCells(board)
+    cells = analysis.inferior_moves()
+    if player is not None:
+        cells |= analysis.dominated_moves(player)
+    mask = np.zeros(board.size, dtype=bool)
+    mask[list(cells)] = True
+    return mask.reshape(board.shape)
+
+
+
+if __name__ == "__main__":
+    from hex import Hex
+
+    _hex = Hex(5)
+    for action in [(1, 1), (2, 2), (1, 3), (2, 1), (3, 2), (0, 4)]:
+        _hex.play(action)
+    _hex.rich_print()
+    analysis = InferiorCells(_hex.board)
+    print('Dead', sorted(divmod(cell, 5) for cell in analysis.dead))
+    for player in [1, -1]:
+        print(f'Captured by {Hex.player_int_to_char(player)}',
+              sorted(divmod(cell, 5) for cell in analysis.captured[player]))
+        print(f'Dominated for {Hex.player_int_to_char(player)}',
+              sorted(divmod(cell, 5) for cell in analysis.dominated_moves(player)))
@@ -0,0 +1,101 @@
+import numpy as np
+
+from hex import Hex
+from hex_batch import winners_of
+from hex_bitboard import BitBoard, get_masks
+
+
+def fill_randomly(boards: np.ndarray, players: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """
+    Random playouts to the end of N games at once
+    The empty cells of every board are taken in a random order and given alternately,
+    starting with the player to move. A full board always has exactly one winner,
+    so no winner needs to be checked along the way.
+    boards: (N, size, size), players: (N,), returns the filled boards
+    """
+    n_boards, size = len(boards), boards.shape[-1]
+    flat_boards = boards.reshape(n_boards, -1)
+    empty = flat_boards == 0
+
+    # random rank of every empty cell, the stones sort last
+    keys = rng.random(flat_boards.shape)
+    keys[~empty] = 2
+    order = keys.argsort(axis=1)
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(flat_boards.shape[1])[None, :], axis=1)
+
+    players = np.asarray(players)[:, None]
+    filled = np.where(empty, np.where(ranks % 2 == 0, players, -players), flat_boards)
+    return filled.astype(boards.dtype, copy=False).reshape(n_boards, size, size)
+
+
+def random_playout(hex: Hex, rng: np.random.Generator) -> int:
+    """
+    Winner of one random playout from the current position of the game
+    Same as fill_randomly, with one bitboard flood fill instead of the batched dilation
+    """
+    if hex.winner is not None:
+        return hex.winner
+    flat_board = hex.board.reshape(-1)
+    cells = rng.permutation(np.flatnonzero(flat_board == 0))
+    first = flat_board == 1
+    # the player to move gets every other cell, starting with the first one
+    start = 0 if hex.player == 1 else 1
+    first[cells[start::2]] = True
+
+    masks = get_masks(hex.size)
+    first_bits = BitBoard.pack(first)
+    reached = BitBoard(hex.size, first=first_bits).flood_fill(first_bits, masks.first_row)
+    return 1 if reached & masks.last_row else -1
+
+
+def playout_win_rates(hex: Hex, n_playouts: int, rng: np.random.Generator,
+                      batch_size: int = 20_000) -> np.ndarray:
+    """
+    Win rate of the player to move after each of its legal moves, over n_playouts random playouts each
+    Returns a (size, size) array, nan on the occupied cells
+    batch_size
+        Maximal number of boards filled at once, bounds the memory used
+    """
+    size, player = hex.size, hex.player
+    board = hex.board.astype(np.int8)
+    moves = np.flatnonzero(board.reshape(-1) == 0)
+    win_rates = np.full(size * size, np.nan)
+    if hex.winner is not None:
+        return win_rates.reshape(size, size)
+
+    # every move repeated n_playouts times
+    all_moves = np.repeat(moves, n_playouts)
+    wins = np.zeros(len(moves))
+    for start in range(0, len(all_moves), batch_size):
+        batch_moves = all_moves[start:start + batch_size]
+        boards = np.repeat(board.reshape(1, -1), len(batch_moves), axis=0)
+        boards[np.arange(len(batch_moves)), batch_moves] = player
+        boards = boards.reshape(-1, size, size)
+
+        filled = fill_randomly(boards, np.full(len(batch_moves), -player), rng)
+        won = winners_of(filled) == player
+        np.add.at(wins, np.searchsorted(moves, batch_moves), won)
+
+    win_rates[moves] = wins / n_playouts
+    return win_rates.reshape(size, size)
+
+
+
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(0)
+    _hex = Hex(7)
+    _hex.play((3, 3))
+    _hex.play((2, 4))
+
+    start = time.perf_counter()
+    win_rates = playout_win_rates(_hex, n_playouts=200, rng=rng)
+    elapsed = time.perf_counter() - start
+
+    np.set_printoptions(precision=2)
+    print(win_rates)
+    n_playouts = np.count_nonzero(~np.isnan(win_rates)) * 200
+    print(f'{n_playouts} playouts in {elapsed:.2f}s, {n_playouts / elapsed:.0f} playouts/s')
+    print('One playout, winner', random_playout(_hex, rng))
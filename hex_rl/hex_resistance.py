@@ -0,0 +1,158 @@
+"""
+Resistance evaluation: the board as an electrical circuit between the edges of a player
+
+Every cell is a resistor: 1 when empty, STONE_RESISTANCE for a stone of the player, and a stone of the
+opponent cuts it off. Two adjacent cells are joined by the sum of their resistances, the edges of the player
+by the resistance of the cells along them. The lower the resistance between the edges, the better connected
+the player is, and the evaluation compares the resistances of both players.
+
+A board is one linear system on the voltages of its cells, the edges held at 1 and 0. The systems of
+many boards, or of every candidate move of a board, are solved in one batched call.
+A cell is only joined to the cells of its row and of the adjacent rows: in row-major order every system
+is a band matrix of bandwidth size, block tridiagonal with one (size, size) block per row pair.
+It is solved by block elimination, size batched solves of (size, size) blocks, numpy only.
+"""
+
+import numpy as np
+from typing import NamedTuple
+
+from hex import get_neighbor_table
+
+
+STONE_RESISTANCE = 1e-3
+# the resistance of a player with no path left, and of the opponent of a connected player
+MAX_RESISTANCE = 1e6
+# conductance from every cell to the ground, keeps the cells cut off by the opponent at voltage 0
+_LEAK = 1e-9
+
+
+class ResistanceStructure(NamedTuple):
+    pairs: np.ndarray        # (n_pairs, 2) flat indices of the adjacent cells, the lower index first
+    rows: np.ndarray         # (n_pairs,) row of the first cell of every pair
+    columns: np.ndarray      # (n_pairs, 2) columns of both cells of every pair
+    in_row: np.ndarray       # (n_pairs,) whether both cells are in the same row, else the second is in the next
+    upper: np.ndarray        # (n_cells,) 1 along the upper edge
+    lower: np.ndarray        # (n_cells,) 1 along the lower edge
+
+
+_STRUCTURES: dict[int, ResistanceStructure] = dict()
+
+
+def get_resistance_structure(size: int) -> ResistanceStructure:
+    """The circuit of a player connecting the upper & lower edges, computed once per size"""
+    if size not in _STRUCTURES:
+        n_cells = size * size
+        pairs = np.array([(cell, neighbor) for cell, neighbors in enumerate(get_neighbor_table(size))
+                          for neighbor in neighbors if cell < neighbor])
+        rows, columns = np.divmod(pairs, size)
+        upper, lower = np.zeros(n_cells), np.zeros(n_cells)
+        upper[:size], lower[-size:] = 1, 1
+        _STRUCTURES[size] = ResistanceStructure(pairs, rows[:, 0], columns, rows[:, 0] == rows[:, 1], upper, lower)
+    return _STRUCTURES[size]
+
+
+def solve_block_tridiagonal(diagonal: np.ndarray, off_diagonal: np.ndarray, rhs: np.ndarray) -> np.ndarray:
+    """
+    Solutions x of A x = rhs for a batch of symmetric positive definite block tridiagonal matrices A
+    diagonal: (N, m, k, k) blocks A[i, i], off_diagonal: (N, m - 1, k, k) blocks A[i, i + 1]
+    rhs: (N, m, k), returns (N, m, k). O(N * m * k ** 3) time and O(N * m * k ** 2) memory
+    """
+    n_blocks, block = diagonal.shape[1], diagonal.shape[2]
+    # block row i - 1 eliminated from block row i, keeping A'[i, i] ^ -1 [A[i, i + 1], rhs'[i]]
+    schur, reduced = diagonal[:, 0], rhs[:, 0]
+    eliminated = list()
+    for i in range(1, n_blocks):
+        solved = np.linalg.solve(schur, np.concatenate([off_diagonal[:, i - 1], reduced[..., np.newaxis]], axis=2))
+        eliminated.append(solved)
+        lower = off_diagonal[:, i - 1].transpose(0, 2, 1)
+        schur = diagonal[:, i] - lower @ solved[..., :block]
+        reduced = rhs[:, i] - (lower @ solved[..., block:])[..., 0]
+
+    solution = np.empty_like(rhs)
+    solution[:, -1] = np.linalg.solve(schur, reduced[..., np.newaxis])[..., 0]
+    for i in reversed(range(n_blocks - 1)):
+        solved = eliminated[i]
+        solution[:, i] = solved[..., block] - (solved[..., :block] @ solution[:, i + 1, :, np.newaxis])[..., 0]
+    return solution
+
+
+def resistance(boards: np.ndarray, player: int) -> np.ndarray:
+    """
+    Resistance between the edges of the player on every board
+    boards: (N, size, size) or (size, size), returns (N,) or a float
+    Player -1 is measured on the transposed boards with the stones negated, as in hex_batch.winners_of
+    """
+    single = boards.ndim == 2
+    boards = np.asarray(boards).reshape(-1, *boards.shape[-2:])
+    if player == -1:
+        boards = -boards.transpose(0, 2, 1)
+    n_boards, size = len(boards), boards.shape[-1]
+    n_cells = size * size
+    structure = get_resistance_structure(size)
+
+    flat_boards = boards.reshape(n_boards, n_cells)
+    cells = np.where(flat_boards == 1, STONE_RESISTANCE, 1.0)
+    cut = flat_boards == -1
+    first, second = structure.pairs[:, 0], structure.pairs[:, 1]
+    conductances = 1 / (cells[:, first] + cells[:, second])
+    conductances[cut[:, first] | cut[:, second]] = 0
+    to_edges = np.where(cut, 0, 1 / cells)
+    to_upper, to_lower = to_edges * structure.upper, to_edges * structure.lower
+
+    # Kirchhoff's law at every cell, the upper edge at voltage 1 and the lower edge at 0,
+    # with a block for every row and for every two adjacent rows
+    diagonal_blocks = np.zeros((n_boards, size, size, size))
+    off_diagonal_blocks = np.zeros((n_boards, size - 1, size, size))
+    in_row, rows, columns = structure.in_row, structure.rows, structure.columns
+    diagonal_blocks[:, rows[in_row], columns[in_row, 0], columns[in_row, 1]] = -conductances[:, in_row]
+    diagonal_blocks[:, rows[in_row], columns[in_row, 1], columns[in_row, 0]] = -conductances[:, in_row]
+    off_diagonal_blocks[:, rows[~in_row], columns[~in_row, 0], columns[~in_row, 1]] = -conductances[:, ~in_row]
+    diagonal = (to_upper + to_lower + _LEAK).T
+    np.add.at(diagonal, first, conductances.T)
+    np.add.at(diagonal, second, conductances.T)
+    diagonal_blocks[:, :, np.arange(size), np.arange(size)] = diagonal.T.reshape(n_boards, size, size)
+    voltages = solve_block_tridiagonal(diagonal_blocks, off_diagonal_blocks,
+                                       to_upper.reshape(n_boards, size, size)).reshape(n_boards, n_cells)
+
+    currents = (to_upper * (1 - voltages)).sum(axis=1)
+    resistances = np.minimum(1 / np.maximum(currents, 1 / MAX_RESISTANCE), MAX_RESISTANCE)
+    return float(resistances[0]) if single else resistances
+
+
+def evaluate(boards: np.ndarray, player: int) -> np.ndarray:
+    """
+    log(resistance of the opponent / resistance of the player) on every board,
+    positive when the player is better connected. Shapes as in resistance
+    """
+    return np.log(resistance(boards, -player) / resistance(boards, player))
+
+
+def evaluate_moves(board: np.ndarray, player: int) -> np.ndarray:
+    """
+    (size, size) evaluation after every move of the player on the board, all moves in one batch,
+    -inf on the occupied cells
+    """
+    moves = np.flatnonzero(board.reshape(-1) == 0)
+    after_moves = np.repeat(board.reshape(1, -1), len(moves), axis=0)
+    after_moves[np.arange(len(moves)), moves] = player
+    scores = np.full(board.size, -np.inf)
+    if len(moves):
+        scores[moves] = evaluate(after_moves.reshape(-1, *board.shape), player)
+    return scores.reshape(board.shape)
+
+
+
+if __name__ == "__main__":
+    import time
+    from hex import Hex
+
+    for size in [5, 7, 9, 11, 19]:
+        _hex = Hex(size)
+        for action in [(size // 2, size // 2), (size // 2 - 1, size // 2 + 1), (size // 2 + 1, size // 2 - 1)]:
+            _hex.play(action)
+        evaluate_moves(_hex.board, _hex.player)
+        start = time.perf_counter()
+        scores = evaluate_moves(_hex.board, _hex.player)
+        elapsed = time.perf_counter() - start
+        print(f'{size}x{size}: resistance of X {resistance(_hex.board, 1):.3f}, of O {resistance(_hex.board, -1):.3f}, '
+              f'{np.isfinite(scores).sum()} moves of O evaluated in {elapsed * 1000:.1f}ms')
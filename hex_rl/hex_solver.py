@@ -0,0 +1,297 @@
+"""
+Exact solver of small Hex boards
+
+Depth-first search on bitboards (see hex_bitboard) with:
+    immediate wins      an empty cell joining groups that touch both edges of the player
+    must-play region    moves that do not stop a double threat of the opponent are skipped
+    move ordering       forcing moves, then the last winning moves found at the same number of stones,
+                        then from the center outwards
+    symmetry            the four transforms of hex_symmetry share one key, reimplemented here on the
+                        bitboards: a bit reversal for the rotation and a table per row for the transpose
+Proven results go to a SolutionTable, an open addressing hash table in a memory-mapped .npy file,
+so a board solved once is known instantly on later runs. The tables under model/ are not tracked by git.
+"""
+
+import os
+import numpy as np
+from typing import Optional
+
+from hex import Hex
+from hex_bitboard import BitBoard, get_masks
+
+
+MAX_SOLVER_SIZE = 5
+# tables of an earlier version may hold wrong results, the version is part of their file name
+TABLE_VERSION = 2
+TABLE_PATH_FORMAT = 'model/solved_{size}_v' + str(TABLE_VERSION) + '.npy'
+
+# results of the table, for the player to move
+UNKNOWN, WIN, LOSS = 0, 1, -1
+
+
+class SolutionTable:
+    DTYPE = np.dtype([('key', '<u8'), ('result', 'i1')])
+
+    def __init__(self, path: Optional[str] = None, n_bits: int = 22) -> None:
+        """
+        Proven results by key, in a memory-mapped .npy file of 2 ** n_bits entries
+        The file is created if it does not exist, or mapped as is, whatever n_bits.
+        path None keeps the table in memory only.
+        """
+        if path is None:
+            self.entries = np.zeros(1 << n_bits, dtype=self.DTYPE)
+        elif os.path.exists(path):
+            self.entries = np.load(path, mmap_mode='r+')
+        else:
+            self.entries = np.lib.format.open_memmap(path, mode='w+', dtype=self.DTYPE, shape=(1 << n_bits,))
+        self.path = path
+        self.n_bits = len(self.entries).bit_length() - 1
+        self.mask = len(self.entries) - 1
+        self._keys = self.entries['key']
+        self._results = self.entries['result']
+        self.n_entries = int(np.count_nonzero(self._results))
+
+
+    def _index(self, key: int) -> int:
+        # Fibonacci hashing, the keys are bitboards and their low bits alone are far from uniform
+        return ((key * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> (64 - self.n_bits)
+
+
+    def get(self, key: int) -> int:
+        index = self._index(key)
+        while True:
+            result = self._results[index]
+            if result == UNKNOWN or self._keys[index] == key:
+                return int(result)
+            index = (index + 1) & self.mask
+
+
+    def put(self, key: int, result: int) -> None:
+        # linear probing, nothing more is stored once the table is 90% full
+        if self.n_entries >= 0.9 * len(self.entries):
+            return
+        index = self._index(key)
+        while self._results[index] != UNKNOWN:
+            if self._keys[index] == key:
+                return
+            index = (index + 1) & self.mask
+        self._keys[index] = key
+        self._results[index] = result
+        self.n_entries += 1
+
+
+    def flush(self) -> None:
+        if isinstance(self.entries, np.memmap):
+            self.entries.flush()
+
+
+
+class Solver:
+    def __init__(self, size: int, path: Optional[str] = None, n_bits: int = 22) -> None:
+        """
+        Solves positions of one board size, up to MAX_SOLVER_SIZE
+        path, n_bits
+            The SolutionTable of the results, shared by all solvers of the size
+        """
+        if not Hex.LOWER_SIZE_LIMIT <= size <= MAX_SOLVER_SIZE:
+            raise ValueError(f"The solver supports sizes {Hex.LOWER_SIZE_LIMIT} to {MAX_SOLVER_SIZE}, got {size}")
+
+        self.size = size
+        self.n_cells = size * size
+        self.masks = get_masks(size)
+        # only for its bit operations
+        self.bitboard = BitBoard(size)
+        self.table = SolutionTable(path, n_bits)
+        self.n_nodes = 0
+
+        # cells from the center outwards, the order in which moves are tried
+        center = size // 2
+        order = sorted(range(self.n_cells), key=lambda cell: (
+            abs(cell // size - center) + abs(cell % size - center) + abs(cell // size + cell % size - 2 * center)))
+        self.ordered_bits = [1 << cell for cell in order]
+        self.killers = [[0, 0] for _ in range(self.n_cells + 1)]
+
+        # transpose of every row of bits, for the symmetric keys
+        row_mask = (1 << size) - 1
+        self._row_mask = row_mask
+        self._transposed_rows = [
+            [sum(1 << (col * size + row) for col in range(size) if bits >> col & 1) for bits in range(row_mask + 1)]
+            for row in range(size)
+        ]
+        self._bin_format = f'0{self.n_cells}b'
+
+
+    def _transpose(self, bits: int) -> int:
+        # cell (row, col) to (col, row)
+        size, row_mask, transposed_rows = self.size, self._row_mask, self._transposed_rows
+        result = 0
+        for row in range(size):
+            result |= transposed_rows[row][(bits >> (row * size)) & row_mask]
+        return result
+
+
+    def _rotate(self, bits: int) -> int:
+        # cell (row, col) to (size - 1 - row, size - 1 - col), the bits reversed
+        return int(format(bits, self._bin_format)[::-1], 2)
+
+
+    def key(self, first: int, second: int, player: int) -> int:
+        """
+        Exact key of a position, the smallest over its four symmetries:
+        the stones of 1, the stones of -1 and the player to move as one integer
+        """
+        n_cells = self.n_cells
+        to_move = 0 if player == 1 else 1 << (2 * n_cells)
+        swapped_to_move = (1 << (2 * n_cells)) - to_move
+        transposed_first, transposed_second = self._transpose(first), self._transpose(second)
+        return min(
+            first | second << n_cells | to_move,
+            self._rotate(first) | self._rotate(second) << n_cells | to_move,
+            # the swaps exchange the colors, the player to move and the edges
+            self._rotate(transposed_second) | self._rotate(transposed_first) << n_cells | swapped_to_move,
+            transposed_second | transposed_first << n_cells | swapped_to_move,
+        )
+
+
+    def _edges(self, player: int) -> tuple[int, int]:
+        masks = self.masks
+        return (masks.first_row, masks.last_row) if player == 1 else (masks.first_col, masks.last_col)
+
+
+    def _is_connected(self, stones: int, player: int) -> bool:
+        first_edge, last_edge = self._edges(player)
+        return bool(self.bitboard.flood_fill(stones, first_edge) & last_edge)
+
+
+    def _winning_cells(self, stones: int, empty: int, player: int) -> int:
+        """Empty cells joining both edges of the player at once"""
+        first_edge, last_edge = self._edges(player)
+        bitboard = self.bitboard
+        first_side = bitboard.expand(bitboard.flood_fill(stones, first_edge)) | first_edge
+        last_side = bitboard.expand(bitboard.flood_fill(stones, last_edge)) | last_edge
+        return first_side & last_side & empty
+
+
+    def _candidates(self, own: int, other: int, empty: int, player: int) -> int:
+        """
+        Moves that may not lose at once, without immediate wins on either side:
+        a move of the opponent with two winning cells after it must be answered by that move
+        or one of the two cells, unless the move gives the player a winning cell of its own
+        """
+        region = empty
+        bits = empty
+        while bits:
+            bit = bits & -bits
+            bits ^= bit
+            threats = self._winning_cells(other | bit, empty & ~bit, -player)
+            if threats & (threats - 1):
+                region &= threats | bit
+        if region == empty:
+            return region
+
+        bits = empty & ~region
+        while bits:
+            bit = bits & -bits
+            bits ^= bit
+            if self._winning_cells(own | bit, empty & ~bit, player):
+                region |= bit
+        return region
+
+
+    def _solve(self, first: int, second: int, player: int) -> int:
+        self.n_nodes += 1
+        own, other = (first, second) if player == 1 else (second, first)
+        # the last move won, as after a winning move tried by winning_move
+        if self._is_connected(other, -player):
+            return LOSS
+        key = self.key(first, second, player)
+        result = self.table.get(key)
+        if result != UNKNOWN:
+            return result
+
+        empty = self.masks.full & ~(first | second)
+        if self._winning_cells(own, empty, player):
+            self.table.put(key, WIN)
+            return WIN
+        threats = self._winning_cells(other, empty, -player)
+        if threats & (threats - 1):
+            # two ways to win, only one can be blocked
+            self.table.put(key, LOSS)
+            return LOSS
+        candidates = threats if threats else self._candidates(own, other, empty, player)
+
+        n_stones = (first | second).bit_count()
+        killers = self.killers[n_stones]
+        moves = [killer for killer in killers if candidates & killer] + \
+            [bit for bit in self.ordered_bits if candidates & bit and bit not in killers]
+        if not threats:
+            # moves making a winning cell leave the opponent one reply, they are tried first
+            forcing = [bit for bit in moves if self._winning_cells(own | bit, empty & ~bit, player)]
+            moves = forcing + [bit for bit in moves if bit not in forcing]
+
+        result = LOSS
+        for bit in moves:
+            if player == 1:
+                child = self._solve(first | bit, second, -1)
+            else:
+                child = self._solve(first, second | bit, 1)
+            if child == LOSS:
+                result = WIN
+                if killers[0] != bit:
+                    killers[1], killers[0] = killers[0], bit
+                break
+
+        self.table.put(key, result)
+        return result
+
+
+    def _bits(self, board: np.ndarray) -> tuple[int, int]:
+        flat_board = board.reshape(-1)
+        return BitBoard.pack(flat_board == 1), BitBoard.pack(flat_board == -1)
+
+
+    def solve(self, board: np.ndarray, player: int = 1) -> int:
+        """WIN if the player to move wins with perfect play, LOSS otherwise"""
+        if board.shape[-1] != self.size:
+            raise ValueError(f"The solver is for size {self.size}, got a board of size {board.shape[-1]}")
+        first, second = self._bits(board)
+        winner = BitBoard(self.size, first, second).check_winner()
+        if winner is not None:
+            return WIN if winner == player else LOSS
+        result = self._solve(first, second, player)
+        self.table.flush()
+        return result
+
+
+    def winning_move(self, board: np.ndarray, player: int = 1) -> Optional[tuple[int, int]]:
+        """A move keeping the win of the player to move, None if the position is lost"""
+        if self.solve(board, player) != WIN:
+            return None
+        first, second = self._bits(board)
+        for bit in self.ordered_bits:
+            if (first | second) & bit:
+                continue
+            if player == 1:
+                child = self._solve(first | bit, second, -1)
+            else:
+                child = self._solve(first, second | bit, 1)
+            if child == LOSS:
+                self.table.flush()
+                return divmod(bit.bit_length() - 1, self.size)
+        return None
+
+
+
+if __name__ == "__main__":
+    import time
+
+    # 5x5 takes a few minutes the first time, then is read from the file
+    for size in range(Hex.LOWER_SIZE_LIMIT, MAX_SOLVER_SIZE + 1):
+        solver = Solver(size, path=TABLE_PATH_FORMAT.format(size=size))
+        start = time.perf_counter()
+        board = Hex(size).board
+        result = solver.solve(board)
+        move = solver.winning_move(board)
+        elapsed = time.perf_counter() - start
+        print(f'{size}x{size}: first player {"wins" if result == WIN else "loses"}, first move {move}, '
+              f'{solver.n_nodes} nodes in {elapsed:.2f}s, {solver.table.n_entries} results in the table')
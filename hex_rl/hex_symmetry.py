@@ -0,0 +1,117 @@
+"""
+Symmetries of Hex positions
+
+A position is a board together with the player to move. Four transforms keep the game:
+    IDENTITY        the position itself
+    ROTATE          the board rotated by 180 degrees
+    SWAP            colors swapped and the board mirrored, as in Hex.inverse
+    SWAP_ROTATE     colors swapped and the board transposed
+The two swaps also swap the player to move. Every transform is its own inverse.
+"""
+
+import numpy as np
+
+from hex import Hex, board_key
+
+
+IDENTITY, ROTATE, SWAP, SWAP_ROTATE = range(4)
+N_TRANSFORMS = 4
+
+# sign of the stones after each transform
+SIGNS = np.array([1, 1, -1, -1], dtype=np.int8)
+
+
+def _build_index_maps(size: int) -> np.ndarray:
+    # transformed_flat_board = SIGNS[t] * flat_board[maps[t]]
+    rows, cols = np.divmod(np.arange(size * size), size)
+    last = size - 1
+    return np.stack([
+        rows * size + cols,
+        (last - rows) * size + (last - cols),
+        (last - cols) * size + (last - rows),
+        cols * size + rows,
+    ])
+
+
+INDEX_MAPS: dict[int, np.ndarray] = {
+    size: _build_index_maps(size) for size in range(Hex.LOWER_SIZE_LIMIT, Hex.UPPER_SIZE_LIMIT + 1)
+}
+
+
+def transform(board: np.ndarray, player: int, transform_id: int) -> tuple[np.ndarray, int]:
+    """Applies a transform to a (size, size) board and the player to move"""
+    size = board.shape[-1]
+    flat_board = board.reshape(-1)[INDEX_MAPS[size][transform_id]] * SIGNS[transform_id]
+    return flat_board.reshape(size, size).astype(board.dtype, copy=False), player * int(SIGNS[transform_id])
+
+
+def transform_action(tup_action: tuple[int, int], transform_id: int, size: int) -> tuple[int, int]:
+    """
+    The cell in the transformed board of a cell in the original board
+    Also maps back, since every transform is its own inverse
+    """
+    row, col = tup_action
+    flat_action = int(INDEX_MAPS[size][transform_id][row * size + col])
+    return divmod(flat_action, size)
+
+
+def _candidates(boards: np.ndarray, players: np.ndarray) -> np.ndarray:
+    # (N, N_TRANSFORMS, 1 + size * size): the player to move followed by the flat board
+    size = boards.shape[-1]
+    flat_boards = boards.reshape(len(boards), -1).astype(np.int8)
+    transformed = flat_boards[:, INDEX_MAPS[size]] * SIGNS[None, :, None]
+    transformed_players = np.asarray(players, dtype=np.int8)[:, None] * SIGNS[None, :]
+    return np.concatenate([transformed_players[:, :, None], transformed], axis=2)
+
+
+def canonicalize_batch(boards: np.ndarray, players: np.ndarray
+                       ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Canonical form of N positions: the lexicographically smallest of the transformed positions
+    boards: (N, size, size), players: (N,)
+    Returns the canonical boards, the canonical players, and the transform used for each
+    """
+    size = boards.shape[-1]
+    candidates = _candidates(boards, players)
+    indices = np.arange(len(boards))
+
+    best = np.zeros(len(boards), dtype=np.intp)
+    for transform_id in range(1, N_TRANSFORMS):
+        diff = candidates[:, transform_id] - candidates[indices, best]
+        first_diff = (diff != 0).argmax(axis=1)
+        smaller = diff[indices, first_diff] < 0
+        best[smaller] = transform_id
+
+    chosen = candidates[indices, best]
+    canonical_boards = chosen[:, 1:].reshape(len(boards), size, size).astype(boards.dtype, copy=False)
+    return canonical_boards, chosen[:, 0].astype(int), best
+
+
+def canonicalize(board: np.ndarray, player: int = 1) -> tuple[np.ndarray, int, int]:
+    """Canonical form of one position, see canonicalize_batch"""
+    canonical_boards, canonical_players, transform_ids = canonicalize_batch(board[None], np.array([player]))
+    return canonical_boards[0], int(canonical_players[0]), int(transform_ids[0])
+
+
+def canonical_key(board: np.ndarray, player: int = 1) -> int:
+    """Zobrist key of the canonical form, the same for all symmetric positions"""
+    canonical_board, canonical_player, _ = canonicalize(board, player)
+    return board_key(canonical_board, canonical_player)
+
+
+
+if __name__ == "__main__":
+    _hex = Hex(5)
+    _hex.play((0, 1))
+    _hex.play((2, 2))
+    _hex.play((1, 3))
+
+    print(_hex.board, 'player', _hex.player)
+    for transform_id in range(N_TRANSFORMS):
+        board, player = transform(_hex.board, _hex.player, transform_id)
+        print(f'Transform {transform_id}, player {player}, key {canonical_key(board, player):#x}')
+        print(board)
+
+    canonical_board, canonical_player, transform_id = canonicalize(_hex.board, _hex.player)
+    print('Canonical, player', canonical_player, 'transform', transform_id)
+    print(canonical_board)
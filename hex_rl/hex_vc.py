@@ -0,0 +1,268 @@
+"""
+Virtual connections: links between stones, or a stone and an edge, that the opponent cannot cut
+
+    bridge          two stones with two common empty neighbors, the carrier.
+                    If the opponent takes one, the player takes the other.
+    template II     a stone on the second row from an edge of the player, with its two neighbors on the edge row empty
+    ziggurat        template IIIa, a stone on the third row with a 2-3-4 shaped carrier of empty cells
+                    towards the edge, in both mirror forms
+
+A chain of groups linked by such connections with disjoint carriers, from one edge of a player
+to the other, wins the game for that player whoever moves, long before check_winner.
+The opponent must then play in the carrier of the chain, the must-play region.
+
+The connections are updated at every move: the ones whose carrier the stone fills are removed,
+and the new ones of the stone are added. Chains are searched on demand.
+Player 1 owns the upper & lower edges, as in Hex. Cells are flat indices,
+the edges are the virtual edge nodes of Hex after the size * size cells.
+"""
+
+import numpy as np
+from collections import deque
+from typing import NamedTuple, Optional
+
+from hex import TOP, BOTTOM, LEFT, RIGHT, get_neighbor_table, get_edge_table
+
+
+class Connection(NamedTuple):
+    player: int
+    ends: tuple[int, int]
+    carrier: frozenset[int]
+
+
+_BRIDGE_TABLES: dict[int, list[list[tuple[int, frozenset[int]]]]] = dict()
+_TEMPLATE_TABLES: dict[int, dict[int, list[list[tuple[int, frozenset[int]]]]]] = dict()
+
+# offset of the other stone of a bridge, and of the two cells of its carrier
+_BRIDGE_OFFSETS = [
+    ((-2, 1), (-1, 0), (-1, 1)), ((-1, 2), (-1, 1), (0, 1)), ((1, 1), (0, 1), (1, 0)),
+    ((2, -1), (1, 0), (1, -1)), ((1, -2), (1, -1), (0, -1)), ((-1, -1), (0, -1), (-1, 0)),
+]
+
+
+def get_bridge_table(size: int) -> list[list[tuple[int, frozenset[int]]]]:
+    """The other stone and the carrier of every bridge of every cell"""
+    if size not in _BRIDGE_TABLES:
+        table = list()
+        for row in range(size):
+            for col in range(size):
+                bridges = list()
+                for cells in _BRIDGE_OFFSETS:
+                    (r, c), *carrier = [(row + dr, col + dc) for dr, dc in cells]
+                    if all(0 <= r_ < size and 0 <= c_ < size for r_, c_ in [(r, c), *carrier]):
+                        bridges.append((r * size + c, frozenset(r_ * size + c_ for r_, c_ in carrier)))
+                table.append(bridges)
+        _BRIDGE_TABLES[size] = table
+    return _BRIDGE_TABLES[size]
+
+
+def _top_templates(size: int) -> list[tuple[tuple[int, int], list[tuple[int, int]]]]:
+    # the stone and the carrier of every template to the upper edge
+    templates = list()
+    for col in range(size):
+        templates.append(((1, col), [(0, col), (0, col + 1)]))
+        for side in [1, -1]:
+            # ziggurat, the second cell of the third row on either side of the stone
+            first = col if side == 1 else col - 1
+            templates.append(((2, col), [(2, col + side)]
+                              + [(1, first + i) for i in range(3)] + [(0, first + i) for i in range(4)]))
+    return [(stone, carrier) for stone, carrier in templates
+            if all(0 <= c < size for _, c in [stone, *carrier])]
+
+
+def get_template_table(size: int) -> dict[int, list[list[tuple[int, frozenset[int]]]]]:
+    """The edge node and the carrier of every edge template of every cell, per player"""
+    if size not in _TEMPLATE_TABLES:
+        n_cells, last = size * size, size - 1
+        # the upper edge, turned to the others: rotated, transposed, and both
+        to_edges = {
+            1: [(TOP, lambda r, c: (r, c)), (BOTTOM, lambda r, c: (last - r, last - c))],
+            -1: [(LEFT, lambda r, c: (c, r)), (RIGHT, lambda r, c: (last - c, last - r))],
+        }
+        tables = dict()
+        for player, edges in to_edges.items():
+            table = [list() for _ in range(n_cells)]
+            for edge, to_edge in edges:
+                for stone, carrier in _top_templates(size):
+                    row, col = to_edge(*stone)
+                    cells = frozenset(r * size + c for r, c in (to_edge(*cell) for cell in carrier))
+                    table[row * size + col].append((n_cells + edge, cells))
+            tables[player] = table
+        _TEMPLATE_TABLES[size] = tables
+    return _TEMPLATE_TABLES[size]
+
+
+
+class VirtualConnections:
+    def __init__(self, board: np.ndarray) -> None:
+        """
+        Connections of both players on a (size, size) board, kept up to date like InferiorCells:
+            hex.play(action)
+            connections.update(hex.board, action)
+            hex.unplay()
+            connections.undo()
+        """
+        self.size = board.shape[-1]
+        self.n_cells = self.size * self.size
+        self._flat_board = board.reshape(-1).tolist()
+        self.connections: set[Connection] = set()
+        # the connections with every cell in their carrier
+        self._by_cell: dict[int, set[Connection]] = {cell: set() for cell in range(self.n_cells)}
+        # connections added and removed by every update
+        self._undo_stack: list[tuple[int, int, list[Connection], list[Connection]]] = list()
+
+        for cell, stone in enumerate(self._flat_board):
+            if stone != 0:
+                self._add_connections(cell, stone, list())
+
+
+    def _add(self, connection: Connection, added: list[Connection]) -> None:
+        if connection not in self.connections:
+            self.connections.add(connection)
+            for cell in connection.carrier:
+                self._by_cell[cell].add(connection)
+            added.append(connection)
+
+
+    def _remove(self, connection: Connection) -> None:
+        self.connections.discard(connection)
+        for cell in connection.carrier:
+            self._by_cell[cell].discard(connection)
+
+
+    def _add_connections(self, cell: int, player: int, added: list[Connection]) -> None:
+        flat_board = self._flat_board
+        for other, carrier in get_bridge_table(self.size)[cell]:
+            if flat_board[other] == player and all(flat_board[c] == 0 for c in carrier):
+                self._add(Connection(player, (min(cell, other), max(cell, other)), carrier), added)
+        for edge, carrier in get_template_table(self.size)[player][cell]:
+            if all(flat_board[c] == 0 for c in carrier):
+                self._add(Connection(player, (cell, edge), carrier), added)
+
+
+    def update(self, board: np.ndarray, tup_action: tuple[int, int]) -> None:
+        """After a stone is placed on the cell, board is the new board"""
+        row, col = tup_action
+        cell = row * self.size + col
+        stone = int(board[row, col])
+        self._flat_board[cell] = stone
+
+        removed = list(self._by_cell[cell])
+        for connection in removed:
+            self._remove(connection)
+        added: list[Connection] = list()
+        self._add_connections(cell, stone, added)
+        self._undo_stack.append((cell, stone, added, removed))
+
+
+    def undo(self) -> None:
+        """Takes back the last update"""
+        cell, _, added, removed = self._undo_stack.pop()
+        self._flat_board[cell] = 0
+        for connection in added:
+            self._remove(connection)
+        for connection in removed:
+            self._add(connection, list())
+
+
+    def bridges(self, player: int) -> list[Connection]:
+        return [c for c in self.connections if c.player == player and c.ends[1] < self.n_cells]
+
+
+    def edge_templates(self, player: int) -> list[Connection]:
+        return [c for c in self.connections if c.player == player and c.ends[1] >= self.n_cells]
+
+
+    def _groups(self, player: int) -> list[int]:
+        # group of every stone of the player, and of the edges of the player, by flood fill
+        flat_board, n_cells = self._flat_board, self.n_cells
+        neighbor_table = get_neighbor_table(self.size)
+        group_of = list(range(n_cells + 4))
+        for cell in range(n_cells):
+            if flat_board[cell] != player or group_of[cell] != cell:
+                continue
+            stack = [cell]
+            while stack:
+                curr = stack.pop()
+                for neighbor in neighbor_table[curr]:
+                    if flat_board[neighbor] == player and group_of[neighbor] == neighbor and neighbor != cell:
+                        group_of[neighbor] = cell
+                        stack.append(neighbor)
+        # the edges join the groups touching them, a group touching both joins them together
+        for cell, edges in enumerate(get_edge_table(self.size)[player]):
+            if flat_board[cell] != player:
+                continue
+            for edge in edges:
+                old, new = group_of[edge], group_of[cell]
+                if old != new:
+                    group_of = [new if group == old else group for group in group_of]
+        return group_of
+
+
+    def winning_chain(self, player: int) -> Optional[list[Connection]]:
+        """
+        Connections with disjoint carriers linking the groups of the player from edge to edge, None if
+        none was found. The search keeps the carrier of the first path to every group,
+        so it may miss a chain that exists.
+        """
+        n_cells = self.n_cells
+        first_edge, last_edge = (TOP, BOTTOM) if player == 1 else (LEFT, RIGHT)
+        group_of = self._groups(player)
+        start, goal = group_of[n_cells + first_edge], group_of[n_cells + last_edge]
+        if start == goal:
+            return list()
+
+        links: dict[int, list[tuple[int, Connection]]] = dict()
+        for connection in self.connections:
+            if connection.player != player:
+                continue
+            a, b = (group_of[end] for end in connection.ends)
+            if a != b:
+                links.setdefault(a, list()).append((b, connection))
+                links.setdefault(b, list()).append((a, connection))
+
+        # breadth-first over the groups, with the carrier used by the path to each
+        paths: dict[int, tuple[list[Connection], frozenset[int]]] = {start: (list(), frozenset())}
+        queue = deque([start])
+        while queue:
+            group = queue.popleft()
+            chain, used = paths[group]
+            for other, connection in links.get(group, list()):
+                if other in paths or used & connection.carrier:
+                    continue
+                paths[other] = (chain + [connection], used | connection.carrier)
+                if other == goal:
+                    return paths[other][0]
+                queue.append(other)
+        return None
+
+
+    def is_won(self, player: int) -> bool:
+        """Whether the player has a winning chain, and wins whoever moves"""
+        return self.winning_chain(player) is not None
+
+
+    def must_play(self, player: int) -> Optional[set[int]]:
+        """
+        The cells where the player to move must play to stop the winning chain of the opponent,
+        None if the opponent has no chain. Empty if the opponent already won.
+        """
+        chain = self.winning_chain(-player)
+        if chain is None:
+            return None
+        return set().union(*(connection.carrier for connection in chain))
+
+
+
+if __name__ == "__main__":
+    from hex import Hex
+
+    _hex = Hex(7)
+    for action in [(1, 3), (3, 1), (3, 2), (2, 4), (5, 1), (4, 4)]:
+        _hex.play(action)
+    _hex.rich_print()
+    connections = VirtualConnections(_hex.board)
+    for player in [1, -1]:
+        print(f'{Hex.player_int_to_char(player)}: {len(connections.bridges(player))} bridges, '
+              f'{len(connections.edge_templates(player))} edge templates, won {connections.is_won(player)}')
+    print('Must play of O', sorted(divmod(cell, 7) for cell in connections.must_play(-1)))
@@ -0,0 +1,367 @@
+import time
+from typing import Optional
+
+from hex import Hex, inverse_board, inverse_action, get_neighbor_table
+from hex_inferior import InferiorCells
+from hex_vc import VirtualConnections
+
+
+# scores are from the player to move, a win is worth more than any evaluation
+WIN_SCORE = 1_000_000
+INFINITY = 2 * WIN_SCORE
+UNREACHABLE = 1_000
+
+# bounds stored in the transposition table
+EXACT, LOWER, UPPER = range(3)
+
+
+def _edge_lines(size: int) -> dict[int, tuple[list[int], list[int]]]:
+    """The cells along both edges of every player, flat indices"""
+    return {
+        1: ([col for col in range(size)], [(size - 1) * size + col for col in range(size)]),
+        -1: ([row * size for row in range(size)], [row * size + size - 1 for row in range(size)]),
+    }
+
+
+def _two_distance(adjacent: list[list[int]], edge_cells: list[int], n_cells: int) -> list[int]:
+    """
+    Two-distance of every empty cell to one edge: 1 next to the edge, otherwise
+    one more than the second best distance among the adjacent cells, since the opponent
+    can always block the best one. Cells are settled in increasing order of distance.
+    """
+    distances = [UNREACHABLE] * n_cells
+    counts = [0] * n_cells
+    for cell in edge_cells:
+        distances[cell] = 1
+    frontier, distance = edge_cells, 1
+    while frontier:
+        next_frontier = list()
+        for cell in frontier:
+            for neighbor in adjacent[cell]:
+                if distances[neighbor] == UNREACHABLE:
+                    counts[neighbor] += 1
+                    if counts[neighbor] == 2:
+                        distances[neighbor] = distance + 1
+                        next_frontier.append(neighbor)
+        frontier, distance = next_frontier, distance + 1
+    return distances
+
+
+def potential(flat_board: list[int], size: int, player: int) -> tuple[int, int]:
+    """
+    Two-distance potential of a player: the smallest sum of the distances of an empty cell
+    to both edges of the player, and the number of cells reaching it.
+    The stones of the player are free to cross, so the empty cells around one group are adjacent.
+    """
+    n_cells = size * size
+    neighbor_table = get_neighbor_table(size)
+    first_line, last_line = _edge_lines(size)[player]
+    first_edge, last_edge = set(first_line), set(last_line)
+
+    # empty cells adjacent to every cell, through the groups of the player
+    adjacent: list[list[int]] = [list() for _ in range(n_cells)]
+    first_cells, last_cells = set(), set()
+    group_of = [-1] * n_cells
+    for cell in range(n_cells):
+        stone = flat_board[cell]
+        if stone == 0:
+            adjacent[cell] = [neighbor for neighbor in neighbor_table[cell] if flat_board[neighbor] == 0]
+            if cell in first_edge:
+                first_cells.add(cell)
+            if cell in last_edge:
+                last_cells.add(cell)
+        elif stone == player and group_of[cell] < 0:
+            # flood fill the group, collect its empty neighbors and the edges it touches
+            group_of[cell] = cell
+            stack, liberties = [cell], set()
+            touches_first = touches_last = False
+            while stack:
+                curr = stack.pop()
+                touches_first |= curr in first_edge
+                touches_last |= curr in last_edge
+                for neighbor in neighbor_table[curr]:
+                    if flat_board[neighbor] == 0:
+                        liberties.add(neighbor)
+                    elif flat_board[neighbor] == player and group_of[neighbor] < 0:
+                        group_of[neighbor] = cell
+                        stack.append(neighbor)
+            if touches_first and touches_last:
+                return 0, 1
+            for liberty in liberties:
+                adjacent[liberty].extend(liberties - {liberty})
+            if touches_first:
+                first_cells |= liberties
+            if touches_last:
+                last_cells |= liberties
+
+    first = _two_distance(adjacent, list(first_cells), n_cells)
+    last = _two_distance(adjacent, list(last_cells), n_cells)
+    best, n_best = 2 * UNREACHABLE, 0
+    for cell in range(n_cells):
+        if flat_board[cell] == 0:
+            total = first[cell] + last[cell]
+            if total < best:
+                best, n_best = total, 1
+            elif total == best:
+                n_best += 1
+    return best, n_best
+
+
+def evaluate(flat_board: list[int], size: int, player: int) -> int:
+    """Two-distance evaluation for the player to move, higher is better"""
+    own, n_own = potential(flat_board, size, player)
+    other, n_other = potential(flat_board, size, -player)
+    # the number of best cells breaks ties, more of them are harder to block
+    return 100 * (other - own) + n_own - n_other
+
+
+
+class TranspositionTable:
+    def __init__(self, n_bits: int = 20) -> None:
+        """
+        Fixed-size table of searched positions, indexed by the low bits of the Zobrist key
+        An entry is replaced by a search of the same depth or deeper, or by any search of a later move
+        Plain lists, faster than numpy arrays for one entry at a time
+        """
+        n_entries = 1 << n_bits
+        self.mask = n_entries - 1
+        self.keys = [-1] * n_entries
+        self.depths = [-1] * n_entries
+        self.scores = [0] * n_entries
+        self.bounds = [EXACT] * n_entries
+        self.moves = [-1] * n_entries
+        self.ages = [0] * n_entries
+        self.age = 0
+
+
+    def get(self, key: int) -> Optional[tuple[int, int, int, int]]:
+        """Depth, score, bound and best move stored for the position, None if absent"""
+        index = key & self.mask
+        if self.keys[index] != key:
+            return None
+        return self.depths[index], self.scores[index], self.bounds[index], self.moves[index]
+
+
+    def store(self, key: int, depth: int, score: int, bound: int, move: int) -> None:
+        index = key & self.mask
+        if self.keys[index] != key and self.ages[index] == self.age and self.depths[index] > depth:
+            return
+        self.keys[index] = key
+        self.depths[index] = depth
+        self.scores[index] = score
+        self.bounds[index] = bound
+        self.moves[index] = move
+        self.ages[index] = self.age
+
+
+
+class _Timeout(Exception):
+    pass
+
+
+
+class AlphaBetaModel:
+    def __init__(self, max_depth: int = 64, time_limit: Optional[float] = 1.0, tt_bits: int = 20,
+                 prune_inferior: bool = True, use_vc: bool = True):
+        """
+        Negamax alpha-beta search with iterative deepening and the two-distance evaluation
+        max_depth
+            Deepest iteration, the search stops earlier when time_limit is reached
+        time_limit
+            Maximal seconds per move. The best move of the last iteration is played, among the moves it
+            searched to the end if it was interrupted, so the first one is not wasted on a large board.
+            None searches to max_depth, the moves are then deterministic
+        tt_bits
+            The transposition table has 2 ** tt_bits entries, kept between moves
+        prune_inferior
+            Skips the dead, captured and dominated cells, see hex_inferior, the analysis follows every move of the search
+        use_vc
+            Scores the positions with a winning chain of virtual connections, see hex_vc, as won
+            without searching them
+
+        Moves are ordered by the move of the transposition table, then two killer moves per ply,
+        then the history heuristic, then from the center outwards.
+        """
+        self.max_depth = max_depth
+        self.time_limit = time_limit
+        self.tt_bits = tt_bits
+        self.table = TranspositionTable(tt_bits)
+        self.prune_inferior = prune_inferior
+        self.analysis: Optional[InferiorCells] = None
+        self.use_vc = use_vc
+        self.connections: Optional[VirtualConnections] = None
+
+        self.size = None
+        self.n_nodes = 0
+        self.last_depth = 0
+        self.last_score = 0
+        # best move at the root of the current iteration, -1 until one is searched to the end
+        self._root_move = -1
+
+
+    def _reset_ordering(self, size: int) -> None:
+        self.size = size
+        self.killers = [[-1, -1] for _ in range(size * size + 1)]
+        self.history = [0] * (size * size)
+        # hexagonal distance to the center, the last criterion of the move ordering
+        center = (size - 1) / 2
+        self.center_distances = [
+            max(abs(cell // size - center), abs(cell % size - center), abs(cell // size + cell % size - 2 * center))
+            for cell in range(size * size)]
+
+
+    def _check_time(self) -> None:
+        self.n_nodes += 1
+        if self.deadline is not None and self.n_nodes % 16 == 0 and time.perf_counter() > self.deadline:
+            raise _Timeout()
+
+
+    def _ordered_moves(self, hex: Hex, ply: int, tt_move: int) -> list[int]:
+        killers = self.killers[ply]
+        history = self.history
+        moves = [row * self.size + col for row, col in hex.legal_moves()]
+        if self.analysis is not None:
+            moves = self.analysis.pruned_moves(moves, hex.player)
+        # stable sorts, the moves of equal history stay ordered from the center outwards
+        moves.sort(key=self.center_distances.__getitem__)
+        moves.sort(key=history.__getitem__, reverse=True)
+        first = [move for move in (tt_move, killers[0], killers[1]) if move in moves]
+        if first:
+            first = list(dict.fromkeys(first))
+            moves = first + [move for move in moves if move not in first]
+        return moves
+
+
+    def _negamax(self, hex: Hex, depth: int, alpha: int, beta: int, ply: int) -> int:
+        self._check_time()
+        if hex.winner is not None:
+            # the last move won, earlier wins score higher
+            return -WIN_SCORE + ply
+        if depth == 0:
+            return evaluate(hex.board.reshape(-1).tolist(), self.size, hex.player)
+        if self.connections is not None and ply > 0:
+            # won whoever moves, at the earliest after the next move of the winner
+            if self.connections.is_won(hex.player):
+                return WIN_SCORE - ply - 1
+            if self.connections.is_won(-hex.player):
+                return -WIN_SCORE + ply + 2
+
+        key = hex.key
+        alpha_start = alpha
+        tt_move = -1
+        entry = self.table.get(key)
+        if entry is not None:
+            tt_depth, tt_score, tt_bound, tt_move = entry
+            if tt_depth >= depth:
+                if tt_bound == EXACT:
+                    return tt_score
+                if tt_bound == LOWER:
+                    alpha = max(alpha, tt_score)
+                else:
+                    beta = min(beta, tt_score)
+                if alpha >= beta:
+                    return tt_score
+
+        best_score, best_move = -INFINITY, -1
+        for move in self._ordered_moves(hex, ply, tt_move):
+            action = divmod(move, self.size)
+            hex.play(action)
+            if self.analysis is not None:
+                self.analysis.update(hex.board, action)
+            if self.connections is not None:
+                self.connections.update(hex.board, action)
+            try:
+                score = -self._negamax(hex, depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                hex.unplay()
+                if self.analysis is not None:
+                    self.analysis.undo()
+                if self.connections is not None:
+                    self.connections.undo()
+
+            if score > best_score:
+                best_score, best_move = score, move
+                if ply == 0:
+                    self._root_move = move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                killers = self.killers[ply]
+                if killers[0] != move:
+                    killers[1], killers[0] = killers[0], move
+                self.history[move] += depth * depth
+                break
+
+        if best_score <= alpha_start:
+            bound = UPPER
+        elif best_score >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.table.store(key, depth, best_score, bound, best_move)
+        return best_score
+
+
+    def search(self, hex: Hex) -> int:
+        """Best move of the player to move as a flat index, by iterative deepening"""
+        if hex.size != self.size:
+            self._reset_ordering(hex.size)
+            self.table = TranspositionTable(self.tt_bits)
+        self.table.age += 1
+        self.n_nodes = 0
+        self.deadline = None if self.time_limit is None else time.perf_counter() + self.time_limit
+        self.analysis = InferiorCells(hex.board) if self.prune_inferior else None
+        self.connections = VirtualConnections(hex.board) if self.use_vc else None
+
+        legal_moves = [row * hex.size + col for row, col in hex.legal_moves()]
+        # played if not even one move of the first iteration is searched in time
+        best_move = min(legal_moves, key=self.center_distances.__getitem__)
+        max_depth = min(self.max_depth, len(legal_moves))
+        for depth in range(1, max_depth + 1):
+            self._root_move = -1
+            try:
+                score = self._negamax(hex, depth, -INFINITY, INFINITY, 0)
+            except _Timeout:
+                # the moves searched to the end before the timeout, the first is the previous best move
+                if self._root_move >= 0:
+                    best_move = self._root_move
+                break
+            entry = self.table.get(hex.key)
+            if entry is not None and entry[3] >= 0:
+                best_move = entry[3]
+            self.last_depth, self.last_score = depth, score
+            if abs(score) >= WIN_SCORE - depth:
+                # the game is solved
+                break
+        return best_move
+
+
+    def predict(self, board):
+        hex = Hex.from_board(board, player=1)
+        return divmod(self.search(hex), board.shape[-1])
+
+
+    def predict_inverse(self, board):
+        return inverse_action(self.predict(inverse_board(board)), board.shape[-1])
+
+
+
+if __name__ == '__main__':
+    from model_dqn import DQNModel
+
+    size = 5
+    model = AlphaBetaModel(time_limit=0.5)
+    start = time.perf_counter()
+    model.predict(Hex(size).board)
+    elapsed = time.perf_counter() - start
+    print(f'depth {model.last_depth}, {model.n_nodes} nodes in {elapsed:.2f}s, {model.n_nodes / elapsed:.0f} nodes/s')
+
+    dqn_model = DQNModel(size=size, load_path=f'model/dqn_hard_{size}')
+    for player in [1, -1]:
+        _hex = Hex(size)
+        while _hex.winner is None:
+            if _hex.player == player:
+                _hex.play(model.predict(_hex.board) if player == 1 else model.predict_inverse(_hex.board))
+            else:
+                _hex.play(dqn_model.predict(_hex.board) if player == -1 else dqn_model.predict_inverse(_hex.board))
+        print(f'Alpha-beta as {Hex.player_int_to_char(player)} against DQN: winner {_hex.get_char_winner()}')
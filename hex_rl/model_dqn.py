@@ -1,16 +1,21 @@
 import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
-from typing import Optional
+from typing import Callable, Optional
 
 from stable_baselines3 import PPO, DQN
 from stable_baselines3.common.env_checker import check_env
+from stable_baselines3.common.vec_env import VecEnv
 
 import torch as th
 import torch.nn as nn
+import torch.nn.functional as F
 from stable_baselines3.common.torch_layers import BaseFeaturesExtractor
 
-from hex import Hex, InvalidActionError
+from hex import Hex, InvalidActionError, inverse_board, inverse_action
+from hex_batch import BatchHex
+from hex_book import OpeningBook
+from hex_inferior import inferior_mask
 
 from model_random import RandomModel
 
@@ -32,24 +37,110 @@ class CustomCNN(BaseFeaturesExtractor):
         return self.cnn(observations)
 
 
+class MaskedDQN(DQN):
+    """
+    DQN that never chooses an occupied cell: in the random warmup, in the epsilon-greedy exploration,
+    in the greedy actions, and in the maximum of the target Q-values
+    The mask is read from the observations, a board where the empty cells are 0, so the
+    replay buffer needs nothing more. Same masks as in the action_mask of the infos of HexEnv and HexVecEnv
+    """
+
+    def _legal(self, observation: np.ndarray) -> np.ndarray:
+        return np.asarray(observation).reshape(-1, int(np.prod(self.observation_space.shape))) == 0
+
+
+    def _random_legal(self, legal: np.ndarray) -> np.ndarray:
+        return np.where(legal, np.random.random(legal.shape), -1).argmax(axis=1)
+
+
+    def predict(self, observation, state=None, episode_start=None, deterministic=False):
+        vectorized = self.policy.is_vectorized_observation(observation)
+        legal = self._legal(observation)
+        with th.no_grad():
+            q_values = self.q_net(self.policy.obs_to_tensor(observation)[0])
+            actions = q_values.masked_fill(~th.as_tensor(legal, device=self.device), -th.inf).argmax(dim=1).cpu().numpy()
+        if not deterministic:
+            explore = np.random.random(len(legal)) < self.exploration_rate
+            actions[explore] = self._random_legal(legal[explore])
+        return (actions if vectorized else actions[0]), state
+
+
+    def _sample_action(self, learning_starts, action_noise=None, n_envs=1):
+        if self.num_timesteps < learning_starts:
+            actions = self._random_legal(self._legal(self._last_obs))
+        else:
+            actions, _ = self.predict(self._last_obs, deterministic=False)
+        return actions, actions
+
+
+    def train(self, gradient_steps: int, batch_size: int = 100) -> None:
+        # DQN.train, with the target maximum over the legal moves of the next observations
+        self.policy.set_training_mode(True)
+        self._update_learning_rate(self.policy.optimizer)
+
+        losses = []
+        for _ in range(gradient_steps):
+            replay_data = self.replay_buffer.sample(batch_size, env=self._vec_normalize_env)
+
+            with th.no_grad():
+                next_observations = replay_data.next_observations
+                legal = next_observations.reshape(len(next_observations), -1) == 0
+                next_q_values = self.q_net_target(next_observations).masked_fill(~legal, -th.inf)
+                next_q_values, _ = next_q_values.max(dim=1)
+                # a full board has no legal move, and ends the game
+                next_q_values = th.where(legal.any(dim=1), next_q_values, 0).reshape(-1, 1)
+                target_q_values = replay_data.rewards + (1 - replay_data.dones) * self.gamma * next_q_values
+
+            current_q_values = self.q_net(replay_data.observations)
+            current_q_values = th.gather(current_q_values, dim=1, index=replay_data.actions.long())
+
+            loss = F.smooth_l1_loss(current_q_values, target_q_values)
+            losses.append(loss.item())
+
+            self.policy.optimizer.zero_grad()
+            loss.backward()
+            th.nn.utils.clip_grad_norm_(self.policy.parameters(), self.max_grad_norm)
+            self.policy.optimizer.step()
+
+        self._n_updates += gradient_steps
+        self.logger.record("train/n_updates", self._n_updates, exclude="tensorboard")
+        self.logger.record("train/loss", np.mean(losses))
+
+
+
 class DQNModel():
-    def __init__(self, size=11, load_path: Optional[str]="dqn_hex") -> None:
+    def __init__(self, size=11, load_path: Optional[str]="dqn_hex", book_path: Optional[str] = None,
+                 prune_inferior: bool = False, n_envs: int = 1, mask_actions: bool = True) -> None:
+        """
+        book_path: opening book consulted before the q_net, see hex_book, ignored if the file does not exist
+        prune_inferior: never play the dead, captured and dominated cells, see hex_inferior, unless only those are left
+        n_envs: a new model trains on that many games at once in a HexVecEnv, on one HexEnv if 1
+        mask_actions: the model is a MaskedDQN, that never tries the occupied cells, also when loaded
+        """
+        self.book = OpeningBook.open(book_path)
+        self.mask_actions = mask_actions
+        self.prune_inferior = prune_inferior
         self.env = HexEnv(hex=Hex(size=size))
-        check_env(self.env)
 
         if load_path is None:
-            self.model = DQN("MlpPolicy",
-                            self.env,
-                            verbose=1,
-                            policy_kwargs={'features_extractor_class': CustomCNN},
-                            exploration_initial_eps=1.0,  # default 1.0
-                            exploration_fraction=0.02,  # default 0.1
-                            exploration_final_eps=0.8)
+            # the env is checked only for training, a loaded model just predicts
+            check_env(self.env)
+            dqn_class = MaskedDQN if mask_actions else DQN
+            self.model = dqn_class("MlpPolicy",
+                                   self.env if n_envs == 1 else HexVecEnv(n_envs, size),
+                                   verbose=1,
+                                   policy_kwargs={'features_extractor_class': CustomCNN},
+                                   exploration_initial_eps=1.0,  # default 1.0
+                                   exploration_fraction=0.02,  # default 0.1
+                                   exploration_final_eps=0.8)
         else:
             self.load(load_path)
 
         
     def train(self, total_timesteps=100_000) -> None:
+        # a loaded model has no env until it is trained further
+        if self.model.get_env() is None:
+            self.model.set_env(self.env)
         self.model.learn(total_timesteps=total_timesteps)
 
 
@@ -58,7 +149,8 @@ class DQNModel():
 
 
     def load(self, path="dqn_hex") -> None:
-        self.model = DQN.load(path)
+        dqn_class = MaskedDQN if self.mask_actions else DQN
+        self.model = dqn_class.load(path)
 
 
     def predict_q(self, obs):
@@ -68,32 +160,55 @@ class DQNModel():
 
 
     def predict_action(self, obs):
-        q_values = self.predict_q(obs)[0]
-        # print("q_values\n", q_values)
-        indices = np.flip(np.argsort(q_values))
-        # print("indices\n", indices)
-        # print('sorted q_values\n', q_values[indices])
-        
-        for i in indices:
-            # print(i)
-            row, col = divmod(i, self.env.hex.size)
-            # print(row, col)
-            # print(obs[0, row, col])
-            if obs[0, row, col] == 0:
-                return i
+        return int(self._q_actions(obs[np.newaxis])[0])
 
 
     def predict(self, board):
-        return divmod(self.predict_action(np.expand_dims(board, axis=0)), self.env.hex.size)
-    
+        return tuple(self.predict_batch(board[np.newaxis])[0].tolist())
+
 
     def predict_inverse(self, board):
-        hex = Hex(size=self.env.hex.size)
-        hex.board = board
-        hex.inverse()
-        row, col = divmod(self.predict_action(np.expand_dims(hex.board, axis=0)), self.env.hex.size)
-        row_inv, col_inv = self.env.hex.size - 1 - col, self.env.hex.size - 1 - row
-        return row_inv, col_inv
+        return inverse_action(self.predict(inverse_board(board)), self.env.hex.size)
+
+
+    def _q_actions(self, boards: np.ndarray) -> np.ndarray:
+        # flat actions of the q_net, one forward pass with the occupied cells masked as -inf
+        with th.inference_mode():
+            obs = th.as_tensor(boards.reshape(len(boards), 1, *boards.shape[-2:]), dtype=th.float32)
+            q_values = self.model.q_net(obs)
+            illegal = obs.reshape(len(boards), -1) != 0
+            if self.prune_inferior:
+                inferior = th.as_tensor(np.array([inferior_mask(board, player=1).reshape(-1)
+                                                  for board in boards.reshape(obs.shape[0], *obs.shape[2:])]))
+                # the inferior cells stay legal on the boards where only those are left
+                illegal |= inferior & ~(illegal | inferior).all(dim=1, keepdim=True)
+            return q_values.masked_fill(illegal, -th.inf).argmax(dim=1).numpy()
+
+
+    def predict_batch(self, boards) -> np.ndarray:
+        """
+        (N, 2) rows and columns of the moves of player 1 on (N, size, size) or (N, 1, size, size) boards,
+        the book moves first, then one forward pass of the q_net over the boards out of the book
+        """
+        size = self.env.hex.size
+        boards = np.asarray(boards).reshape(-1, size, size)
+        moves = np.zeros((len(boards), 2), dtype=np.int64)
+        in_book = np.zeros(len(boards), dtype=bool)
+        if self.book is not None:
+            for index, board in enumerate(boards):
+                book_move = self.book.lookup(board)
+                if book_move is not None:
+                    moves[index], in_book[index] = book_move, True
+        if not in_book.all():
+            moves[~in_book] = np.stack(np.divmod(self._q_actions(boards[~in_book]), size), axis=1)
+        return moves
+
+
+    def predict_inverse_batch(self, boards) -> np.ndarray:
+        """(N, 2) rows and columns of the moves of player -1, see predict_batch"""
+        size = self.env.hex.size
+        boards = np.asarray(boards).reshape(-1, size, size)
+        return inverse_action(self.predict_batch(inverse_board(boards)), size)
     
 
 class HexEnv(gym.Env):
@@ -102,14 +217,22 @@ class HexEnv(gym.Env):
         super(HexEnv, self).__init__()
         self.hex = hex
         self.dqn_model = dqn_model
+        self.random_model = RandomModel()
 
         self.action_space = spaces.Discrete(hex.size * hex.size)
         self.observation_space = spaces.Box(low=-1, high=1, shape=(1, hex.size, hex.size), dtype=int)
 
     
     def reset(self, seed=None):
+        if seed is not None:
+            self.random_model.rng = np.random.default_rng(seed)
         self.hex.reset()
-        return np.expand_dims(self.hex.board, axis=0), {}
+        return np.expand_dims(self.hex.board, axis=0), self._info()
+
+
+    def _info(self) -> dict:
+        # the empty cells, the legal actions of the agent
+        return {'action_mask': self.hex.board.reshape(-1) == 0}
 
 
     def step(self, action, inverse=True):
@@ -124,28 +247,29 @@ class HexEnv(gym.Env):
 
             if self.hex.winner is None:
                 if self.dqn_model is None:
-                    row, col = RandomModel().predict(self.hex.board, info={'hex': self.hex})
+                    row, col = self.random_model.predict(self.hex.board, info={'hex': self.hex})
                     self.hex.play((row, col))
                 else:
                     row, col = self.dqn_model.predict(self.hex.board)
                     self.hex.play((row, col))
 
-                if inverse:
-                    self.hex.inverse()
+            # back to the orientation of the agent, also after it won, as inverse() negates the winner
+            if inverse:
+                self.hex.inverse()
 
             
         except InvalidActionError:  # Invalid move
-            return np.expand_dims(self.hex.board, axis=0), -5, False, False, {}  # TODO: truncate the game or not?
+            return np.expand_dims(self.hex.board, axis=0), -5, False, False, self._info()  # TODO: truncate the game or not?
 
 
         if self.hex.winner == curr_player:
-            return np.expand_dims(self.hex.board, axis=0), 1000, True, False, {}
+            return np.expand_dims(self.hex.board, axis=0), 1000, True, False, self._info()
         
         if self.hex.winner == -curr_player:
-            return np.expand_dims(self.hex.board, axis=0), -1000, True, False, {}
+            return np.expand_dims(self.hex.board, axis=0), -1000, True, False, self._info()
         
 
-        return np.expand_dims(self.hex.board, axis=0), 0, False, False, {}
+        return np.expand_dims(self.hex.board, axis=0), 0, False, False, self._info()
 
 
     def render(self, mode='human'):
@@ -162,6 +286,109 @@ class HexEnv(gym.Env):
                 break
 
 
+class HexVecEnv(VecEnv):
+    def __init__(self, n_envs: int, size: int,
+                 opponent: Optional[Callable[[np.ndarray], np.ndarray]] = None, seed: Optional[int] = None):
+        """
+        n_envs games of HexEnv stepped at once on a BatchHex, for DQN.learn
+        The agent is player 1, with the same observations and rewards as HexEnv.step
+        opponent
+            Moves of player 1 on (M, size, size) boards, played by player -1 on the inversed boards,
+            as the dqn_model of HexEnv: (M,) flat actions or (M, 2) rows and columns, as DQNModel.predict_batch.
+            Uniformly random legal moves if None
+        Finished games are reset at once, the last observation is in the info under "terminal_observation"
+        The info of every game has its legal actions under "action_mask", as HexEnv
+        """
+        self.batch = BatchHex(n_envs, size)
+        self.opponent = opponent
+        self.rng = np.random.default_rng(seed)
+        self._actions = np.zeros(n_envs, dtype=np.int64)
+        self.render_mode = None
+        observation_space = spaces.Box(low=-1, high=1, shape=(1, size, size), dtype=int)
+        super().__init__(n_envs, observation_space, spaces.Discrete(size * size))
+
+
+    def _observations(self) -> np.ndarray:
+        return self.batch.boards[:, np.newaxis].astype(self.observation_space.dtype)
+
+
+    def _opponent_actions(self, mask: np.ndarray) -> np.ndarray:
+        # flat actions of player -1 on the boards selected by the mask
+        boards, size = self.batch.boards[mask], self.batch.size
+        if self.opponent is None:
+            scores = np.where(boards.reshape(len(boards), -1) == 0, self.rng.random((len(boards), size * size)), -1)
+            return scores.argmax(axis=1)
+        moves = np.asarray(self.opponent(inverse_board(boards)))
+        if moves.ndim == 1:
+            moves = np.stack(np.divmod(moves, size), axis=1)
+        rows, cols = inverse_action(moves, size).T
+        return rows * size + cols
+
+
+    def reset(self) -> np.ndarray:
+        if self._seeds[0] is not None:
+            self.rng = np.random.default_rng(self._seeds[0])
+        self._reset_seeds()
+        self.batch.reset()
+        observations = self._observations()
+        self.reset_infos = [{'action_mask': observation.reshape(-1) == 0} for observation in observations]
+        return observations
+
+
+    def step_async(self, actions: np.ndarray) -> None:
+        self._actions = np.asarray(actions).reshape(self.num_envs)
+
+
+    def step_wait(self):
+        batch = self.batch
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+
+        valid = batch.boards.reshape(self.num_envs, -1)[np.arange(self.num_envs), self._actions] == 0
+        rewards[~valid] = -5
+        batch.play(self._actions, mask=valid)
+        reply = valid & ~batch.terminated
+        if reply.any():
+            actions = np.zeros(self.num_envs, dtype=np.int64)
+            actions[reply] = self._opponent_actions(reply)
+            batch.play(actions, mask=reply)
+        rewards[batch.winners == 1] = 1000
+        rewards[batch.winners == -1] = -1000
+
+        dones = batch.terminated.copy()
+        observations = self._observations()
+        infos = [dict() for _ in range(self.num_envs)]
+        for index in np.flatnonzero(dones):
+            # a copy, the observations of the finished games are reset below
+            infos[index]['terminal_observation'] = observations[index].copy()
+            infos[index]['TimeLimit.truncated'] = False
+        if dones.any():
+            batch.reset(dones)
+            observations[dones] = 0
+        for info, observation in zip(infos, observations):
+            info['action_mask'] = observation.reshape(-1) == 0
+        return observations, rewards, dones, infos
+
+
+    def close(self) -> None:
+        pass
+
+
+    def get_attr(self, attr_name: str, indices=None) -> list:
+        return [getattr(self, attr_name) for _ in self._get_indices(indices)]
+
+
+    def set_attr(self, attr_name: str, value, indices=None) -> None:
+        setattr(self, attr_name, value)
+
+
+    def env_method(self, method_name: str, *method_args, indices=None, **method_kwargs) -> list:
+        return [getattr(self, method_name)(*method_args, **method_kwargs) for _ in self._get_indices(indices)]
+
+
+    def env_is_wrapped(self, wrapper_class, indices=None) -> list[bool]:
+        return [False for _ in self._get_indices(indices)]
+
+
 if __name__ == "__main__":      
     dqn_model = DQNModel(size=5, load_path=None)
     dqn_model.train(total_timesteps=10_000)
@@ -0,0 +1,189 @@
+import time
+import numpy as np
+from typing import Optional
+
+import torch as th
+
+from hex import Hex, inverse_board, inverse_action, get_inverse_table
+from model_dqn import DQNModel
+
+
+class DQNSearchModel:
+    def __init__(self, dqn_model: DQNModel, n_simulations: int = 800, batch_size: int = 32,
+                 time_limit: Optional[float] = None, c_puct: float = 1.5,
+                 q_scale: float = 10, prior_temperature: float = 1, max_nodes: int = 200_000):
+        """
+        Lookahead search guided by the q_net of a DQN model, in the style of PUCT
+        batch_size
+            Number of leaves collected before one batched forward pass of the q_net,
+            virtual losses keep the leaves of a batch apart
+        q_scale
+            The value of a position is tanh(best Q-value / q_scale)
+        prior_temperature
+            Temperature of the softmax of the standardized Q-values giving the prior of every move
+        """
+        self.dqn_model = dqn_model
+        self.size = dqn_model.env.hex.size
+        self.n_simulations = n_simulations
+        self.batch_size = batch_size
+        self.time_limit = time_limit
+        self.c_puct = c_puct
+        self.q_scale = q_scale
+        self.prior_temperature = prior_temperature
+        self.max_nodes = max_nodes
+
+        # node pool as in MCTSModel, values are from the player who made the move into the node
+        self.visits = np.zeros(max_nodes, dtype=np.int32)
+        self.values = np.zeros(max_nodes, dtype=np.float64)
+        self.virtual_losses = np.zeros(max_nodes, dtype=np.int32)
+        self.priors = np.zeros(max_nodes, dtype=np.float32)
+        self.first_child = np.zeros(max_nodes, dtype=np.int32)
+        self.n_children = np.zeros(max_nodes, dtype=np.int32)
+        self.moves = np.zeros(max_nodes, dtype=np.int32)
+        self.n_nodes = 0
+
+
+    def _new_nodes(self, moves: np.ndarray, priors: np.ndarray) -> int:
+        start, end = self.n_nodes, self.n_nodes + len(moves)
+        self.visits[start:end] = 0
+        self.values[start:end] = 0
+        self.virtual_losses[start:end] = 0
+        self.priors[start:end] = priors
+        self.first_child[start:end] = -1
+        self.n_children[start:end] = 0
+        self.moves[start:end] = moves
+        self.n_nodes = end
+        return start
+
+
+    def _evaluate(self, boards: np.ndarray, players: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        One forward pass of the q_net over all boards
+        Returns the value of every position for the player to move, and the Q-values of every move
+        """
+        # the q_net plays 1, the boards of -1 are inversed first
+        inputs = np.where(players[:, None, None] == 1, boards, inverse_board(boards)).astype(np.float32)
+        with th.inference_mode():
+            q_values = self.dqn_model.model.q_net(th.as_tensor(inputs[:, None])).numpy()
+
+        inverse_table = np.array(get_inverse_table(self.size)[:self.size * self.size])
+        q_values[players == -1] = q_values[players == -1][:, inverse_table]
+        legal = boards.reshape(len(boards), -1) == 0
+        q_values = np.where(legal, q_values, -np.inf)
+        values = np.tanh(q_values.max(axis=1) / self.q_scale)
+        return values, q_values
+
+
+    def _expand(self, node: int, q_values: np.ndarray) -> None:
+        moves = np.flatnonzero(np.isfinite(q_values))
+        if self.n_nodes + len(moves) > self.max_nodes:
+            return
+        # standardized, the scale of the Q-values differs between models
+        logits = q_values[moves] - q_values[moves].mean()
+        logits /= (logits.std() + 1e-6) * self.prior_temperature
+        priors = np.exp(logits - logits.max())
+        self.first_child[node] = self._new_nodes(moves, priors / priors.sum())
+        self.n_children[node] = len(moves)
+
+
+    def _select(self, node: int) -> int:
+        start = self.first_child[node]
+        end = start + self.n_children[node]
+        # every virtual loss counts as a lost visit
+        virtual_losses = self.virtual_losses[start:end]
+        visits = self.visits[start:end] + virtual_losses
+        q = np.where(visits > 0, (self.values[start:end] - virtual_losses) / np.maximum(visits, 1), 0)
+        parent_visits = self.visits[node] + self.virtual_losses[node]
+        u = self.c_puct * self.priors[start:end] * np.sqrt(parent_visits + 1) / (1 + visits)
+        return start + int(np.argmax(q + u))
+
+
+    def _backup(self, path: list[int], value: float, virtual: bool) -> None:
+        # value is for the player to move at the last node, who did not make the move into it
+        for node in reversed(path):
+            value = -value
+            self.visits[node] += 1
+            self.values[node] += value
+            if virtual:
+                self.virtual_losses[node] -= 1
+
+
+    def search(self, hex: Hex) -> np.ndarray:
+        """Visits of every move at the root of the position of the game"""
+        start_time = time.perf_counter()
+        self.n_nodes = 0
+        root = self._new_nodes(np.array([-1]), np.array([1.0]))
+        _, root_q = self._evaluate(hex.board[None], np.array([hex.player]))
+        self._expand(root, root_q[0])
+
+        n_done = 0
+        while n_done < self.n_simulations:
+            pending_paths, pending_boards, pending_players = list(), list(), list()
+            for _ in range(self.batch_size):
+                node, path = root, [root]
+                while self.first_child[node] >= 0 and hex.winner is None:
+                    node = self._select(node)
+                    hex.play(divmod(int(self.moves[node]), self.size))
+                    path.append(node)
+
+                if hex.winner is not None:
+                    # exact value: the player to move lost
+                    self._backup(path, -1.0, virtual=False)
+                elif self.virtual_losses[node] > 0:
+                    # already waiting in this batch
+                    pass
+                else:
+                    self.virtual_losses[path] += 1
+                    pending_paths.append(path)
+                    pending_boards.append(hex.board.copy())
+                    pending_players.append(hex.player)
+
+                for _ in path[1:]:
+                    hex.unplay()
+                n_done += 1
+
+            if pending_paths:
+                values, q_values = self._evaluate(np.array(pending_boards), np.array(pending_players))
+                for path, value, leaf_q in zip(pending_paths, values, q_values):
+                    self._expand(path[-1], leaf_q)
+                    self._backup(path, float(value), virtual=True)
+
+            if self.time_limit is not None and time.perf_counter() - start_time > self.time_limit:
+                break
+
+        visits = np.zeros(self.size * self.size, dtype=np.int64)
+        start = self.first_child[root]
+        end = start + self.n_children[root]
+        visits[self.moves[start:end]] = self.visits[start:end]
+        return visits
+
+
+    def predict(self, board):
+        visits = self.search(Hex.from_board(board, player=1))
+        return divmod(int(np.argmax(visits)), self.size)
+
+
+    def predict_inverse(self, board):
+        return inverse_action(self.predict(inverse_board(board)), self.size)
+
+
+
+if __name__ == '__main__':
+    size = 5
+    dqn_model = DQNModel(size=size, load_path=f'model/dqn_hard_{size}')
+    search_model = DQNSearchModel(dqn_model, n_simulations=400, batch_size=32)
+
+    start = time.perf_counter()
+    search_model.predict(Hex(size).board)
+    print(f'{search_model.n_simulations} simulations in {time.perf_counter() - start:.2f}s')
+
+    wins = 0
+    for game in range(10):
+        _hex = Hex(size)
+        while _hex.winner is None:
+            if _hex.player == 1:
+                _hex.play(search_model.predict(_hex.board))
+            else:
+                _hex.play(dqn_model.predict_inverse(_hex.board))
+        wins += _hex.winner == 1
+    print(f'DQN search (red) against DQN: {wins} wins out of 10')
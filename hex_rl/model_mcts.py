@@ -0,0 +1,204 @@
+import time
+import numpy as np
+from typing import Optional
+
+from hex import Hex, inverse_board, inverse_action
+from hex_playout import random_playout
+
+
+class MCTSModel:
+    def __init__(self, n_simulations: int = 10_000, time_limit: Optional[float] = None,
+                 c_uct: float = 0.5, max_nodes: int = 1_000_000,
+                 rng: Optional[np.random.Generator] = None):
+        """
+        Monte Carlo tree search with UCT selection and random playouts
+        n_simulations
+            Number of simulations per move
+        time_limit
+            Maximal seconds per move, stops before n_simulations if reached
+        c_uct
+            Exploration constant of UCT
+        max_nodes
+            Size of the preallocated node pool, the tree is rebuilt when it is full
+        rng
+            Random generator of the playouts, a fresh unseeded one if None
+
+        The nodes are rows of preallocated arrays and the children of a node are contiguous.
+        The tree is kept between moves: the next search starts at the reply of the opponent.
+        """
+        self.n_simulations = n_simulations
+        self.time_limit = time_limit
+        self.c_uct = c_uct
+        self.max_nodes = max_nodes
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+        # node pool, values are wins of the player who made the move into the node
+        self.visits = np.zeros(max_nodes, dtype=np.int32)
+        self.values = np.zeros(max_nodes, dtype=np.float64)
+        self.first_child = np.zeros(max_nodes, dtype=np.int32)
+        self.n_children = np.zeros(max_nodes, dtype=np.int32)
+        self.n_tried = np.zeros(max_nodes, dtype=np.int32)
+        self.moves = np.zeros(max_nodes, dtype=np.int32)
+
+        self._clear_tree()
+
+
+    def _clear_tree(self) -> None:
+        self.n_nodes = 1
+        self.root = 0
+        self._new_node(0, move=-1)
+        # board expected after our last move, to find the reply of the opponent
+        self._last_board: Optional[np.ndarray] = None
+
+
+    def _new_node(self, node: int, move: int) -> None:
+        self.visits[node] = 0
+        self.values[node] = 0
+        self.first_child[node] = -1
+        self.n_children[node] = 0
+        self.n_tried[node] = 0
+        self.moves[node] = move
+
+
+    def _expand(self, node: int, hex: Hex) -> bool:
+        """Adds the children of the node, False if the pool is full"""
+        legal = [row * hex.size + col for row, col in hex.legal_moves()]
+        start = self.n_nodes
+        if start + len(legal) > self.max_nodes:
+            return False
+        # children in a random order, so that unvisited ones are tried in that order
+        self.rng.shuffle(legal)
+        for i, move in enumerate(legal):
+            self._new_node(start + i, move)
+        self.first_child[node] = start
+        self.n_children[node] = len(legal)
+        self.n_nodes += len(legal)
+        return True
+
+
+    def _select(self, node: int) -> int:
+        start = self.first_child[node]
+        if self.n_tried[node] < self.n_children[node]:
+            self.n_tried[node] += 1
+            return start + self.n_tried[node] - 1
+
+        end = start + self.n_children[node]
+        visits = self.visits[start:end]
+        uct = self.values[start:end] / visits + \
+            self.c_uct * np.sqrt(np.log(self.visits[node]) / visits)
+        return start + int(np.argmax(uct))
+
+
+    def _simulate(self, hex: Hex) -> bool:
+        """One simulation from the root, False if the pool is full"""
+        node = self.root
+        path = [node]
+        while self.first_child[node] >= 0 and hex.winner is None:
+            node = self._select(node)
+            hex.play(divmod(int(self.moves[node]), hex.size))
+            path.append(node)
+
+        if hex.winner is None and self.visits[node] > 0:
+            if not self._expand(node, hex):
+                for _ in path[1:]:
+                    hex.unplay()
+                return False
+            node = self._select(node)
+            hex.play(divmod(int(self.moves[node]), hex.size))
+            path.append(node)
+
+        winner = random_playout(hex, self.rng)
+
+        # the player who made the move into the node, starting from the root
+        player = hex.player if len(path) % 2 == 0 else -hex.player
+        for node in path:
+            self.visits[node] += 1
+            if winner == player:
+                self.values[node] += 1
+            player = -player
+
+        for _ in path[1:]:
+            hex.unplay()
+        return True
+
+
+    def _reuse_tree(self, board: np.ndarray) -> None:
+        """Moves the root to the reply of the opponent, or clears the tree if it is not there"""
+        if self._last_board is None or self._last_board.shape != board.shape:
+            self._clear_tree()
+            return
+
+        changes = np.flatnonzero((board != self._last_board).reshape(-1))
+        if len(changes) == 1 and board.flat[changes[0]] == -1 and self.first_child[self.root] >= 0:
+            start = self.first_child[self.root]
+            end = start + self.n_children[self.root]
+            children = np.flatnonzero(self.moves[start:end] == changes[0])
+            if len(children) == 1:
+                self.root = start + int(children[0])
+                return
+        self._clear_tree()
+
+
+    def search(self, hex: Hex) -> np.ndarray:
+        """Runs the simulations from the position of the game, returns the visits of every move"""
+        start_time = time.perf_counter()
+        if self.first_child[self.root] < 0:
+            self._expand(self.root, hex)
+
+        for i in range(self.n_simulations):
+            if not self._simulate(hex):
+                break
+            if self.time_limit is not None and i % 64 == 0 and \
+                    time.perf_counter() - start_time > self.time_limit:
+                break
+
+        visits = np.zeros(hex.size * hex.size, dtype=np.int64)
+        start = self.first_child[self.root]
+        end = start + self.n_children[self.root]
+        visits[self.moves[start:end]] = self.visits[start:end]
+        return visits
+
+
+    def predict(self, board):
+        size = board.shape[-1]
+        self._reuse_tree(board)
+        if self.n_nodes > self.max_nodes // 2:
+            # keep room for this search
+            self._clear_tree()
+
+        visits = self.search(Hex.from_board(board, player=1))
+        action = int(np.argmax(visits))
+
+        # the next search starts below our move
+        start = self.first_child[self.root]
+        self.root = start + int(np.flatnonzero(self.moves[start:start + self.n_children[self.root]] == action)[0])
+        self._last_board = board.copy()
+        self._last_board.flat[action] = 1
+        return divmod(action, size)
+
+
+    def predict_inverse(self, board):
+        return inverse_action(self.predict(inverse_board(board)), board.shape[-1])
+
+
+
+if __name__ == '__main__':
+    from model_montecarlo import MonteCarloModel
+
+    size = 7
+    model = MCTSModel(n_simulations=2_000)
+    _hex = Hex(size)
+    start = time.perf_counter()
+    model.predict(_hex.board)
+    elapsed = time.perf_counter() - start
+    print(f'{model.n_simulations} simulations in {elapsed:.2f}s, {model.n_simulations / elapsed:.0f} simulations/s')
+
+    wins = 0
+    for game in range(4):
+        _hex = Hex(size)
+        models = {1: MCTSModel(n_simulations=2_000), -1: MonteCarloModel(n_playouts=20)}
+        while _hex.winner is None:
+            model = models[_hex.player]
+            _hex.play(model.predict(_hex.board) if _hex.player == 1 else model.predict_inverse(_hex.board))
+        wins += _hex.winner == 1
+    print(f'MCTS (red) against Monte Carlo: {wins} wins out of 4')
@@ -0,0 +1,273 @@
+import time
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+from typing import Optional
+
+from hex import Hex, inverse_board, inverse_action
+from hex_playout import random_playout
+from model_mcts import MCTSModel
+
+
+class SharedTree:
+    """
+    Node arrays of a search tree in shared memory, so that several processes can grow the same tree
+    Same layout as the node pool of MCTSModel, plus the virtual losses of the nodes in flight
+    """
+    FIELDS = [
+        ('visits', np.int32), ('values', np.float64), ('virtual_losses', np.int32),
+        ('first_child', np.int32), ('n_children', np.int32), ('moves', np.int32),
+    ]
+
+    def __init__(self, max_nodes: int, name: Optional[str] = None) -> None:
+        """Creates the shared memory, or attaches to the existing one if name is given"""
+        self.max_nodes = max_nodes
+        n_bytes = 8 + sum(max_nodes * np.dtype(dtype).itemsize for _, dtype in self.FIELDS)
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=n_bytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        # number of allocated nodes first, then one array per field
+        self.n_nodes = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf)
+        offset = 8
+        for field, dtype in self.FIELDS:
+            setattr(self, field, np.ndarray((max_nodes,), dtype=dtype, buffer=self.shm.buf, offset=offset))
+            offset += max_nodes * np.dtype(dtype).itemsize
+
+
+    def clear(self) -> None:
+        self.n_nodes[0] = 1
+        self._new_nodes(0, np.array([-1]))
+
+
+    def _new_nodes(self, start: int, moves: np.ndarray) -> None:
+        end = start + len(moves)
+        self.visits[start:end] = 0
+        self.values[start:end] = 0
+        self.virtual_losses[start:end] = 0
+        self.first_child[start:end] = -1
+        self.n_children[start:end] = 0
+        self.moves[start:end] = moves
+
+
+    def expand(self, node: int, hex: Hex, lock, rng: np.random.Generator) -> bool:
+        """Adds the children of the node unless another process did, False if the pool is full"""
+        with lock:
+            if self.first_child[node] >= 0:
+                return True
+            legal = np.array([row * hex.size + col for row, col in hex.legal_moves()])
+            start = int(self.n_nodes[0])
+            if start + len(legal) > self.max_nodes:
+                return False
+            self._new_nodes(start, rng.permutation(legal))
+            self.n_nodes[0] = start + len(legal)
+            self.n_children[node] = len(legal)
+            # published last, the children are complete once it is set
+            self.first_child[node] = start
+        return True
+
+
+    def close(self, unlink: bool = False) -> None:
+        # drop the views before closing the buffer
+        for field, _ in self.FIELDS:
+            setattr(self, field, None)
+        self.n_nodes = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+# state of a worker process of the shared tree
+_worker_tree: Optional[SharedTree] = None
+_worker_lock = None
+
+
+def _attach_worker(name: str, max_nodes: int, lock) -> None:
+    global _worker_tree, _worker_lock
+    _worker_tree = SharedTree(max_nodes, name=name)
+    _worker_lock = lock
+
+
+def _select_virtual(tree: SharedTree, node: int, c_uct: float) -> int:
+    # UCT where the simulations in flight count as losses, so processes spread over the tree
+    start = tree.first_child[node]
+    end = start + tree.n_children[node]
+    visits = tree.visits[start:end] + tree.virtual_losses[start:end]
+    unvisited = np.flatnonzero(visits == 0)
+    if len(unvisited):
+        return start + int(unvisited[0])
+    parent_visits = max(tree.visits[node] + tree.virtual_losses[node], 1)
+    uct = tree.values[start:end] / visits + c_uct * np.sqrt(np.log(parent_visits) / visits)
+    return start + int(np.argmax(uct))
+
+
+def _tree_search(args: tuple) -> int:
+    """Simulations of one process on the shared tree, returns how many were done"""
+    board, n_simulations, time_limit, c_uct, seed = args
+    tree, lock = _worker_tree, _worker_lock
+    rng = np.random.default_rng(seed)
+    hex = Hex.from_board(board, player=1)
+    start_time = time.perf_counter()
+
+    for i in range(n_simulations):
+        node = 0
+        path = [node]
+        tree.virtual_losses[node] += 1
+        while tree.first_child[node] >= 0 and hex.winner is None:
+            node = _select_virtual(tree, node, c_uct)
+            tree.virtual_losses[node] += 1
+            hex.play(divmod(int(tree.moves[node]), hex.size))
+            path.append(node)
+
+        if hex.winner is None and tree.visits[node] > 0:
+            if tree.expand(node, hex, lock, rng):
+                node = _select_virtual(tree, node, c_uct)
+                tree.virtual_losses[node] += 1
+                hex.play(divmod(int(tree.moves[node]), hex.size))
+                path.append(node)
+
+        winner = random_playout(hex, rng)
+
+        # updates are not locked, a rare lost update only blurs the statistics
+        player = hex.player if len(path) % 2 == 0 else -hex.player
+        for node in path:
+            tree.visits[node] += 1
+            tree.virtual_losses[node] -= 1
+            if winner == player:
+                tree.values[node] += 1
+            player = -player
+
+        for _ in path[1:]:
+            hex.unplay()
+
+        if time_limit is not None and time.perf_counter() - start_time > time_limit:
+            return i + 1
+    return n_simulations
+
+
+def _root_search(args: tuple) -> np.ndarray:
+    """An independent tree in one process, returns the visits of every move at the root"""
+    board, n_simulations, time_limit, c_uct, max_nodes, seed = args
+    model = MCTSModel(n_simulations=n_simulations, time_limit=time_limit, c_uct=c_uct,
+                      max_nodes=max_nodes, rng=np.random.default_rng(seed))
+    return model.search(Hex.from_board(board, player=1))
+
+
+
+class ParallelMCTSModel:
+    def __init__(self, n_workers: int = 4, mode: str = 'root', n_simulations: int = 40_000,
+                 time_limit: Optional[float] = None, c_uct: float = 0.5, max_nodes: int = 1_000_000,
+                 seed: Optional[int] = None):
+        """
+        Monte Carlo tree search over several processes
+        mode
+            'root': one independent tree per process, their visits are summed at the root
+            'tree': one tree in shared memory, processes use virtual losses to explore different nodes
+        n_simulations
+            Number of simulations per move, over all processes
+        time_limit
+            Maximal seconds per move
+        max_nodes
+            Node pool size, of each tree in 'root' mode and of the shared tree in 'tree' mode
+
+        Worker processes are started at the first move. close(), or leaving a with block, stops them
+        and frees the shared tree; they are started again by the next move
+        """
+        if mode not in ['root', 'tree']:
+            raise ValueError("Mode must be one of 'root' or 'tree'")
+
+        self.n_workers = n_workers
+        self.mode = mode
+        self.n_simulations = n_simulations
+        self.time_limit = time_limit
+        self.c_uct = c_uct
+        self.max_nodes = max_nodes
+        self.seed_sequence = np.random.SeedSequence(seed)
+
+        self._pool = None
+        self._tree: Optional[SharedTree] = None
+        self.last_n_simulations = 0
+
+
+    def _start(self) -> None:
+        if self.mode == 'root':
+            self._pool = mp.Pool(self.n_workers)
+        else:
+            self._tree = SharedTree(self.max_nodes)
+            self._lock = mp.Lock()
+            self._pool = mp.Pool(self.n_workers, initializer=_attach_worker,
+                                 initargs=(self._tree.shm.name, self.max_nodes, self._lock))
+
+
+    def close(self) -> None:
+        try:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+        finally:
+            # the shared memory outlives the process unless unlinked
+            self._pool = None
+            if self._tree is not None:
+                self._tree.close(unlink=True)
+                self._tree = None
+
+
+    def __enter__(self) -> "ParallelMCTSModel":
+        return self
+
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+    def search(self, board: np.ndarray) -> np.ndarray:
+        """Visits of every move at the root, after all processes searched the position"""
+        if self._pool is None:
+            self._start()
+        seeds = [int(seed.generate_state(1)[0]) for seed in self.seed_sequence.spawn(self.n_workers)]
+        n_simulations = -(-self.n_simulations // self.n_workers)
+
+        if self.mode == 'root':
+            tasks = [(board, n_simulations, self.time_limit, self.c_uct, self.max_nodes, seed)
+                     for seed in seeds]
+            all_visits = self._pool.map(_root_search, tasks)
+            self.last_n_simulations = int(sum(visits.sum() for visits in all_visits))
+            return np.sum(all_visits, axis=0)
+
+        tree = self._tree
+        tree.clear()
+        tree.expand(0, Hex.from_board(board, player=1), self._lock, np.random.default_rng(seeds[0]))
+        tasks = [(board, n_simulations, self.time_limit, self.c_uct, seed) for seed in seeds]
+        self.last_n_simulations = sum(self._pool.map(_tree_search, tasks))
+
+        visits = np.zeros(board.size, dtype=np.int64)
+        start = tree.first_child[0]
+        end = start + tree.n_children[0]
+        visits[tree.moves[start:end]] = tree.visits[start:end]
+        return visits
+
+
+    def predict(self, board):
+        visits = self.search(board)
+        return divmod(int(np.argmax(visits)), board.shape[-1])
+
+
+    def predict_inverse(self, board):
+        return inverse_action(self.predict(inverse_board(board)), board.shape[-1])
+
+
+
+if __name__ == '__main__':
+    # simulations per second against the number of workers
+    size = 11
+    board = Hex(size).board
+    print(f'{mp.cpu_count()} cores, board size {size}')
+    for mode in ['root', 'tree']:
+        for n_workers in [1, 2, 4, 8]:
+            with ParallelMCTSModel(n_workers=n_workers, mode=mode, n_simulations=4_000 * n_workers, seed=0) as model:
+                model.search(board)  # start the workers
+                start = time.perf_counter()
+                model.predict(board)
+                elapsed = time.perf_counter() - start
+            print(f'{mode:4s} {n_workers} workers: {model.last_n_simulations / elapsed:8.0f} simulations/s')
@@ -0,0 +1,42 @@
+import numpy as np
+from typing import Optional
+
+from hex import Hex, inverse_board, inverse_action
+from hex_playout import playout_win_rates
+
+
+class MonteCarloModel:
+    def __init__(self, n_playouts: int = 100, rng: Optional[np.random.Generator] = None):
+        """
+        Plays the move with the best win rate over random playouts, see hex_playout
+        n_playouts
+            Number of playouts per legal move
+        rng
+            Random generator of the playouts, a fresh unseeded one if None
+        """
+        self.n_playouts = n_playouts
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def predict(self, board):
+        hex = Hex.from_board(board, player=1)
+        win_rates = playout_win_rates(hex, self.n_playouts, self.rng)
+        row, col = np.unravel_index(np.nanargmax(win_rates), win_rates.shape)
+        return int(row), int(col)
+
+    def predict_inverse(self, board):
+        return inverse_action(self.predict(inverse_board(board)), board.shape[-1])
+
+
+if __name__ == '__main__':
+    from model_random import RandomModel
+
+    size = 7
+    wins = 0
+    for game in range(10):
+        hex = Hex(size)
+        models = {1: MonteCarloModel(n_playouts=50), -1: RandomModel()}
+        while hex.winner is None:
+            model = models[hex.player]
+            hex.play(model.predict(hex.board) if hex.player == 1 else model.predict_inverse(hex.board))
+        wins += hex.winner == 1
+    print(f'Monte Carlo (red) against random: {wins} wins out of 10')
@@ -1,11 +1,21 @@
 import numpy as np
 from pprint import pprint
+from typing import Optional
 
 class RandomModel:
-    def __init__(self):
-        pass
+    def __init__(self, rng: Optional[np.random.Generator] = None):
+        """
+        rng
+            Random generator of the moves, a fresh unseeded one if None
+            Pass a seeded generator for reproducible games, e.g. one per parallel worker
+        """
+        self.rng = rng if rng is not None else np.random.default_rng()
 
     def predict(self, board, info: dict = {}):
+        if 'hex' in info and info['hex'].winner is None:
+            # O(1) from the empty cells kept by the game
+            return info['hex'].random_legal_move(self.rng)
+
         valid_actions = np.where(board == 0)
         n_valid_actions = len(valid_actions[0])
         # TODO
@@ -20,11 +30,15 @@ class RandomModel:
             info['hex']._print_groups()
             print('Inverse\n', info['hex'].inversed)
 
-        action_index = np.random.randint(n_valid_actions)
+        action_index = self.rng.integers(n_valid_actions)
         return valid_actions[0][action_index], valid_actions[1][action_index]
 
+    def predict_inverse(self, board, info: dict = {}):
+        # uniform over the empty cells, whichever the orientation
+        return self.predict(board, info)
+
 
 if __name__ == '__main__':
     board = np.zeros((5, 5))
-    model = RandomModel()
+    model = RandomModel(rng=np.random.default_rng(0))
     print(model.predict(board))
\ No newline at end of file
@@ -0,0 +1,124 @@
+"""
+Registry of the agents loaded by the process, keyed by (kind, difficulty, size)
+
+An agent is loaded on its first request and shared by every later one, e.g. both agents of an
+"ava" game of the same level. When the loaded agents take more than memory_limit bytes,
+the least recently requested ones are dropped, to be loaded again if requested.
+The agent modules are imported by their loaders, so unused kinds are never imported.
+
+    model = get_model('dqn', 'medium', 11)
+    model = get_agent('dqn-medium', 11)      # the agent names of the main menu
+"""
+
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+
+DEFAULT_MEMORY_LIMIT = 512 * 2 ** 20
+
+ModelKey = tuple[str, Optional[str], int]
+
+
+def _load_random(difficulty: Optional[str], size: int) -> Any:
+    from model_random import RandomModel
+    return RandomModel()
+
+
+def _load_dqn(difficulty: Optional[str], size: int) -> Any:
+    from model_dqn import DQNModel
+    return DQNModel(size=size, load_path=f'model/dqn_{difficulty}_{size}',
+                    book_path=f'model/book_dqn_{difficulty}_{size}.npy')
+
+
+# the loader of every kind of agent, from its difficulty and board size
+LOADERS: dict[str, Callable[[Optional[str], int], Any]] = {
+    'random': _load_random,
+    'dqn': _load_dqn,
+}
+
+
+def model_memory(model: Any) -> int:
+    """Bytes of the parameters of the networks of an agent, 0 for an agent without any"""
+    policy = getattr(getattr(model, 'model', None), 'policy', None)
+    if policy is None:
+        return 0
+    return sum(parameter.numel() * parameter.element_size() for parameter in policy.parameters())
+
+
+
+class ModelRegistry:
+    def __init__(self, memory_limit: Optional[int] = DEFAULT_MEMORY_LIMIT) -> None:
+        """
+        memory_limit
+            Bytes of network parameters kept loaded, see model_memory. None never drops an agent.
+            The last requested agent is always kept, even above the limit
+        """
+        self.memory_limit = memory_limit
+        # agents and their memory, the most recently requested last
+        self._models: OrderedDict[ModelKey, tuple[Any, int]] = OrderedDict()
+
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+
+    def __contains__(self, key: ModelKey) -> bool:
+        return key in self._models
+
+
+    @property
+    def memory(self) -> int:
+        return sum(memory for _, memory in self._models.values())
+
+
+    def get(self, kind: str, difficulty: Optional[str], size: int) -> Any:
+        """The agent, loaded if it is not already"""
+        key = (kind, difficulty, size)
+        if key in self._models:
+            self._models.move_to_end(key)
+            return self._models[key][0]
+
+        if kind not in LOADERS:
+            raise ValueError(f"Unknown kind of agent {kind}, expected one of {', '.join(LOADERS)}")
+        model = LOADERS[kind](difficulty, size)
+        self._models[key] = (model, model_memory(model))
+        self._evict()
+        return model
+
+
+    def _evict(self) -> None:
+        if self.memory_limit is None:
+            return
+        while len(self._models) > 1 and self.memory > self.memory_limit:
+            self._models.popitem(last=False)
+
+
+    def clear(self) -> None:
+        self._models.clear()
+
+
+
+# shared by the whole process
+REGISTRY = ModelRegistry()
+
+
+def get_model(kind: str, difficulty: Optional[str], size: int) -> Any:
+    return REGISTRY.get(kind, difficulty, size)
+
+
+def get_agent(agent: str, size: int) -> Any:
+    """The agent of a name of the main menu, "random" or kind-difficulty as "dqn-medium\""""
+    kind, _, difficulty = agent.partition('-')
+    return get_model(kind, difficulty or None, size)
+
+
+
+if __name__ == '__main__':
+    import time
+
+    registry = ModelRegistry(memory_limit=None)
+    for level in ['easy', 'medium', 'medium']:
+        start = time.perf_counter()
+        registry.get('dqn', level, 9)
+        print(f'dqn {level} 9: {(time.perf_counter() - start) * 1000:.1f}ms, {len(registry)} loaded, '
+              f'{registry.memory / 2 ** 20:.2f}MB')
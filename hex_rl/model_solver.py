@@ -0,0 +1,60 @@
+from typing import Optional
+
+from hex import Hex, inverse_board, inverse_action
+from hex_solver import Solver, MAX_SOLVER_SIZE, TABLE_PATH_FORMAT
+
+
+class SolverModel:
+    def __init__(self, path_format: Optional[str] = TABLE_PATH_FORMAT):
+        """
+        Perfect play on boards up to MAX_SOLVER_SIZE, see hex_solver
+        path_format
+            File of the results of every size, None keeps them in memory only.
+            The first move on a new size may take minutes for 5x5, later runs read the file.
+
+        In a lost position, the first legal move from the center outwards is played.
+        """
+        self.path_format = path_format
+        self._solvers: dict[int, Solver] = dict()
+
+
+    def get_solver(self, size: int) -> Solver:
+        if size not in self._solvers:
+            path = None if self.path_format is None else self.path_format.format(size=size)
+            self._solvers[size] = Solver(size, path=path)
+        return self._solvers[size]
+
+
+    def predict(self, board):
+        solver = self.get_solver(board.shape[-1])
+        move = solver.winning_move(board, player=1)
+        if move is not None:
+            return move
+        for bit in solver.ordered_bits:
+            row, col = divmod(bit.bit_length() - 1, solver.size)
+            if board[row, col] == 0:
+                return row, col
+
+
+    def predict_inverse(self, board):
+        return inverse_action(self.predict(inverse_board(board)), board.shape[-1])
+
+
+
+if __name__ == '__main__':
+    from model_dqn import DQNModel
+
+    size = MAX_SOLVER_SIZE
+    model = SolverModel()
+    for level in ['easy', 'medium', 'hard']:
+        dqn_model = DQNModel(size=size, load_path=f'model/dqn_{level}_{size}')
+        winners = list()
+        for dqn_player in [1, -1]:
+            _hex = Hex(size)
+            while _hex.winner is None:
+                if _hex.player == dqn_player:
+                    _hex.play(dqn_model.predict(_hex.board) if dqn_player == 1 else dqn_model.predict_inverse(_hex.board))
+                else:
+                    _hex.play(model.predict(_hex.board) if dqn_player == -1 else model.predict_inverse(_hex.board))
+            winners.append(_hex.winner == dqn_player)
+        print(f'DQN {level} against perfect play: wins as first player {winners[0]}, as second player {winners[1]}')
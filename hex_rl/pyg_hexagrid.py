@@ -16,8 +16,7 @@ from pyg_button import Button, TextButton
 
 import pygame
 from pyg_hexagon import HexagonTile
-from model_random import RandomModel
-from model_dqn import DQNModel
+from model_registry import get_agent
 import time
 
 
@@ -206,25 +205,9 @@ class HexagonGrid:
         curr_player = hex.player
         winner_group = None
 
-        if self.agent_1 == "random":
-            model_1 = RandomModel()
-        elif self.agent_1.startswith("dqn"):
-            if self.agent_1.endswith("easy"):
-                model_1 = DQNModel(size=self.size, load_path=f'model/dqn_easy_{self.size}')
-            elif self.agent_1.endswith("medium"):
-                model_1 = DQNModel(size=self.size, load_path=f'model/dqn_medium_{self.size}')
-            elif self.agent_1.endswith("hard"):
-                model_1 = DQNModel(size=self.size, load_path=f'model/dqn_hard_{self.size}')
-
-        if self.agent_2 == "random":
-            model_2 = RandomModel()
-        elif self.agent_2.startswith("dqn"):
-            if self.agent_2.endswith("easy"):
-                model_2 = DQNModel(size=self.size, load_path=f'model/dqn_easy_{self.size}')
-            elif self.agent_2.endswith("medium"):
-                model_2 = DQNModel(size=self.size, load_path=f'model/dqn_medium_{self.size}')
-            elif self.agent_2.endswith("hard"):
-                model_2 = DQNModel(size=self.size, load_path=f'model/dqn_hard_{self.size}')
+        # agents are loaded only for the sides they play, and shared when both sides are the same
+        model_1 = get_agent(self.agent_1, self.size) if self.mode[0] == "a" else None
+        model_2 = get_agent(self.agent_2, self.size) if self.mode[2] == "a" else None
 
         # agent_1 make the first move
         if self.mode[0] == "a":  # avp ava
@@ -1,5 +1,4 @@
 from tkinter import Tk, Label, Radiobutton, StringVar, Button
-from pyg_hexagrid import HexagonGrid
 
   
 root = Tk() 
@@ -100,6 +99,8 @@ def play():
     
     root.destroy()
 
+    # pygame and the agents are imported after the menu, see model_registry
+    from pyg_hexagrid import HexagonGrid
     HexagonGrid(size=size, mode=mode, agent_1=agent_1, agent_2=agent_2).main()
     
 
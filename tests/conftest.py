@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the modules of hex_rl import each other by their flat names
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'hex_rl'))
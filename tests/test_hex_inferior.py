@@ -0,0 +1,67 @@
+import numpy as np
+
+from hex import Hex
+from hex_inferior import InferiorCells
+from hex_solver import Solver, WIN, LOSS
+
+
+def value(solver: Solver, board: np.ndarray, player: int) -> int:
+    """WIN or LOSS for the player to move, also on finished boards"""
+    winner = Hex.from_board(board, player).winner
+    if winner is not None:
+        return WIN if winner == player else LOSS
+    return solver.solve(board, player)
+
+
+def random_hex(size: int, n_stones: int, rng: np.random.Generator) -> Hex:
+    hex = Hex(size)
+    for _ in range(n_stones):
+        moves = hex.legal_moves()
+        hex.play(moves[rng.integers(len(moves))])
+        if hex.winner is not None:
+            break
+    return hex
+
+
+def test_dominated_moves_against_solver():
+    rng = np.random.default_rng(0)
+    solver = Solver(4, n_bits=16)
+    for _ in range(150):
+        hex = random_hex(4, rng.integers(2, 12), rng)
+        if hex.winner is not None:
+            continue
+        board, player = hex.board.copy(), hex.player
+        analysis = InferiorCells(board)
+
+        # the killer is at least as good as the dominated cell
+        for cell, killer in analysis.dominated[player].items():
+            after_cell, after_killer = board.copy(), board.copy()
+            after_cell.flat[cell], after_killer.flat[killer] = player, player
+            assert value(solver, after_killer, -player) <= value(solver, after_cell, -player), (board, cell, killer)
+
+        # a won position keeps a winning move after pruning
+        if value(solver, board, player) == WIN:
+            moves = analysis.pruned_moves([row * 4 + col for row, col in hex.legal_moves()], player)
+            after_moves = [board.copy() for _ in moves]
+            for after_move, move in zip(after_moves, moves):
+                after_move.flat[move] = player
+            assert any(value(solver, after_move, -player) == LOSS for after_move in after_moves), board
+
+
+def test_update_matches_analysis_from_scratch():
+    rng = np.random.default_rng(1)
+    for _ in range(50):
+        hex = random_hex(5, rng.integers(0, 10), rng)
+        if hex.winner is not None:
+            continue
+        analysis = InferiorCells(hex.board)
+        moves = hex.legal_moves()
+        action = moves[rng.integers(len(moves))]
+        hex.play(action)
+        analysis.update(hex.board, action)
+        fresh = InferiorCells(hex.board)
+        assert (analysis.dead, analysis.captured, analysis.dominated) == (fresh.dead, fresh.captured, fresh.dominated)
+        analysis.undo()
+        hex.unplay()
+        fresh = InferiorCells(hex.board)
+        assert analysis.dominated == fresh.dominated
@@ -0,0 +1,77 @@
+from functools import lru_cache
+
+import numpy as np
+import pytest
+
+from hex_bitboard import BitBoard, get_masks
+from hex_solver import Solver, WIN, LOSS
+
+
+def is_connected(size: int, stones: int, player: int) -> bool:
+    masks = get_masks(size)
+    first_edge, last_edge = (masks.first_row, masks.last_row) if player == 1 else (masks.first_col, masks.last_col)
+    return bool(BitBoard(size).flood_fill(stones, first_edge) & last_edge)
+
+
+@lru_cache(maxsize=None)
+def brute_force(size: int, first: int, second: int, player: int) -> int:
+    """Minimax over every move, WIN or LOSS for the player to move"""
+    for cell in range(size * size):
+        bit = 1 << cell
+        if (first | second) & bit:
+            continue
+        if player == 1:
+            won = is_connected(size, first | bit, 1) or brute_force(size, first | bit, second, -1) == LOSS
+        else:
+            won = is_connected(size, second | bit, -1) or brute_force(size, first, second | bit, 1) == LOSS
+        if won:
+            return WIN
+    return LOSS
+
+
+def random_positions(size: int, n_positions: int, min_stones: int, seed: int = 0) -> list[tuple[np.ndarray, int]]:
+    """Unfinished positions with the player to move"""
+    rng = np.random.default_rng(seed)
+    positions = list()
+    while len(positions) < n_positions:
+        board = np.zeros(size * size, dtype=int)
+        n_stones = rng.integers(min_stones, size * size)
+        board[rng.permutation(size * size)[:n_stones]] = np.where(np.arange(n_stones) % 2 == 0, 1, -1)
+        player = 1 if n_stones % 2 == 0 else -1
+        if not is_connected(size, BitBoard.pack(board == 1), 1) and not is_connected(size, BitBoard.pack(board == -1), -1):
+            positions.append((board.reshape(size, size), player))
+    return positions
+
+
+def is_winning_move(board: np.ndarray, player: int, move: tuple[int, int]) -> bool:
+    child = board.copy()
+    child[move] = player
+    first, second = BitBoard.pack(child.reshape(-1) == 1), BitBoard.pack(child.reshape(-1) == -1)
+    size = board.shape[-1]
+    return is_connected(size, first if player == 1 else second, player) \
+        or brute_force(size, first, second, -player) == LOSS
+
+
+@pytest.mark.parametrize('size, n_positions, min_stones', [(3, 300, 0), (4, 300, 5)])
+def test_solver_matches_brute_force(size, n_positions, min_stones):
+    solver = Solver(size, n_bits=16)
+    for board, player in random_positions(size, n_positions, min_stones):
+        flat_board = board.reshape(-1)
+        expected = brute_force(size, BitBoard.pack(flat_board == 1), BitBoard.pack(flat_board == -1), player)
+        assert solver.solve(board, player) == expected, (board, player)
+
+        move = solver.winning_move(board, player)
+        if expected == LOSS:
+            assert move is None
+        else:
+            assert move is not None and board[move] == 0 and is_winning_move(board, player, move), (board, player)
+
+
+def test_immediate_win_is_played():
+    board = np.array([[-1, 1, 1, 1],
+                      [1, -1, -1, -1],
+                      [0, -1, 1, 1],
+                      [1, 0, -1, -1]])
+    # (2, 0) wins at once, (3, 1) loses
+    move = Solver(4, n_bits=16).winning_move(board, player=1)
+    assert move is not None and is_winning_move(board, 1, move)
@@ -0,0 +1,10 @@
+from hex import Hex
+from model_alphabeta import AlphaBetaModel
+
+
+def test_timeout_plays_a_central_move():
+    # no iteration finishes in time on 19x19, the move must not be the first legal cell (0, 0)
+    model = AlphaBetaModel(time_limit=1e-6)
+    row, col = model.predict(Hex(19).board)
+    assert model.last_depth == 0
+    assert max(abs(row - 9), abs(col - 9)) <= 2
@@ -0,0 +1,67 @@
+import numpy as np
+
+from hex import Hex
+from model_dqn import DQNModel, HexEnv, HexVecEnv, MaskedDQN
+
+
+def test_immediate_win_is_rewarded():
+    env = HexEnv(hex=Hex(3))
+    env.reset()
+    for action in [(0, 0), (0, 1), (1, 0), (1, 1)]:
+        env.hex.play(action)
+
+    # the agent completes the first column, from the upper to the lower edge
+    obs, reward, terminated, truncated, _ = env.step(2 * 3 + 0)
+    assert (reward, terminated, truncated) == (1000, True, False)
+    assert env.hex.winner == 1 and not env.hex.inversed
+    assert (obs[0] == env.hex.board).all()
+
+
+def test_loss_is_penalized():
+    board = np.array([[1, 1, 1],
+                      [-1, -1, 0],
+                      [1, 1, 0]])
+    env = HexEnv(hex=Hex.from_board(board, player=1))
+
+    # the agent takes (2, 2), the only cell left to the opponent completes the middle row
+    obs, reward, terminated, _, _ = env.step(2 * 3 + 2)
+    assert (reward, terminated) == (-1000, True)
+    assert env.hex.winner == -1 and not env.hex.inversed
+    assert obs[0, 1, 2] == -1
+
+
+def test_vec_env_keeps_terminal_observations():
+    env = HexVecEnv(2, 3, seed=0)
+    env.reset()
+    done = np.zeros(2, dtype=bool)
+    while not done.all():
+        boards = env.batch.boards.copy()
+        actions = np.array([np.flatnonzero(board.reshape(-1) == 0)[0] for board in boards])
+        _, _, dones, infos = env.step(actions)
+        for index in np.flatnonzero(dones & ~done):
+            terminal = infos[index]['terminal_observation']
+            # the move of the agent is on the last board, and a full game has at least 3 stones of it
+            assert terminal.reshape(-1)[actions[index]] == 1
+            assert (terminal == 1).sum() >= 3
+        done |= dones
+
+
+def test_vec_env_opponent_moves():
+    def first_empty(boards):
+        return np.array([np.flatnonzero(board.reshape(-1) == 0)[0] for board in boards])
+
+    # flat actions and rows and columns are the same moves
+    flat_env = HexVecEnv(2, 3, opponent=first_empty)
+    tuple_env = HexVecEnv(2, 3, opponent=lambda boards: np.stack(np.divmod(first_empty(boards), 3), axis=1))
+    for env in [flat_env, tuple_env]:
+        env.reset()
+        env.step(np.array([4, 8]))
+    assert (flat_env.batch.boards == tuple_env.batch.boards).all()
+    assert (flat_env.batch.boards == -1).sum() == 2
+
+
+def test_masked_model_reloads_masked(tmp_path):
+    dqn_model = DQNModel(size=3, load_path=None)
+    dqn_model.save(str(tmp_path / 'dqn'))
+    assert isinstance(DQNModel(size=3, load_path=str(tmp_path / 'dqn')).model, MaskedDQN)
+    assert not isinstance(DQNModel(size=3, load_path=str(tmp_path / 'dqn'), mask_actions=False).model, MaskedDQN)